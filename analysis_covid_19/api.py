@@ -0,0 +1,378 @@
+from analysis_covid_19.caching import memoize
+from analysis_covid_19.dataframes.dataset import (
+    get_counties, get_county_index, get_county_metrics, get_national_metrics,
+    get_state_index, get_state_metrics, get_states_and_territories_list,
+    prefetch, start_refresher, use_dataset)
+from analysis_covid_19.instrumentation import span
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import threading
+
+port = int(os.environ.get('COVID_API_PORT', 0))
+
+max_regions = 1000
+
+max_body_size = 64 * 1024
+
+min_gzip_size = 1024
+
+daily_columns = ['new_cases', 'new_cases_avg', 'new_deaths',
+                 'new_deaths_avg']
+
+logger = logging.getLogger(__name__)
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def encode_counts(values: np.ndarray) -> list:
+    """
+    A function for converting an array of counts into a list that can be
+    serialized to json, with missing counts as None.
+    :param values: the counts
+    :type values: np.ndarray
+    :return: a list of ints and Nones
+    :rtype: list
+    """
+    values = np.asarray(values, dtype='float64')
+    missing = np.isnan(values)
+    encoded = np.where(missing, 0, values).astype('int64').astype(object)
+    encoded[missing] = None
+    return encoded.tolist()
+
+
+def region_response(index, metrics, key: tuple) -> dict:
+    """
+    A function for obtaining the series of a state or county that the plot
+    functions draw: the cumulative cases and deaths, and the daily new cases
+    and deaths with their 7 day averages.
+    :param index: the state or county region index
+    :type index: RegionIndex
+    :param metrics: the metrics of the same regions
+    :type metrics: RegionMetrics
+    :param key: the state, or the state and county, of the region
+    :type key: tuple
+    :return: the dates and each series of the region
+    :rtype: dict
+    """
+    start, stop = index.span(*key)
+    if start == stop:
+        raise KeyError('/'.join(key))
+    rows = index.lookup(*key)
+    daily = metrics.lookup(*key)
+    series = {'date': np.datetime_as_string(rows.index.values,
+                                            unit='D').tolist()}
+    for column in ('cases', 'deaths'):
+        series[column] = encode_counts(rows[column].values)
+    for column in daily_columns:
+        series[column] = encode_counts(daily[column].values)
+    return series
+
+
+def national_series(excluded: tuple) -> dict:
+    """
+    A function for obtaining the daily new cases and deaths of the US, with
+    their 7 day averages, excluding a set of states.
+    :param excluded: the states and territories to exclude
+    :type excluded: tuple
+    :return: the dates and each series
+    :rtype: dict
+    """
+    daily = get_national_metrics(excluded_states=excluded)
+    series = {'date': np.datetime_as_string(daily.index.values,
+                                            unit='D').tolist()}
+    for column in daily_columns:
+        series[column] = encode_counts(daily[column].values)
+    return series
+
+
+def parse_county(region: str) -> tuple:
+    """
+    A function for splitting a county region of the form 'State/County'.
+    :param region: the region
+    :type region: str
+    :return: the state and county
+    :rtype: tuple
+    """
+    state, _, county = region.partition('/')
+    if not county:
+        raise ValueError(f'{region!r} is not of the form State/County')
+    return state, county
+
+
+def query(path: str, request: tuple) -> dict:
+    """
+    A function for answering a request for series of the current dataset.
+    The paths are:
+    /regions: the states and territories, and the counties of each
+    /national?exclude=State: the US series, excluding any states given
+    /states?region=State: the series of each state given, by default every
+    state and territory
+    /counties?region=State/County or ?state=State: the series of each county
+    given, or of every county of a state
+    /batch: the series of several paths at once, as a json object of paths
+    and their parameters, e.g. {"states": {"region": ["Texas"]}}
+    :param path: the path of the request
+    :type path: str
+    :param request: the parameters of the request, as sorted pairs of names
+    and lists of values
+    :type request: tuple
+    :return: the response
+    :rtype: dict
+    """
+    parameters = dict(request)
+    if path == '/regions':
+        states = get_states_and_territories_list()
+        return {'states': states,
+                'counties': {state: get_counties(state) for state in states}}
+    if path == '/national':
+        return {'national': national_series(tuple(
+            parameters.get('exclude', ())))}
+    if path == '/states':
+        regions = parameters.get('region') or \
+            get_states_and_territories_list()
+        if len(regions) > max_regions:
+            raise ValueError(f'more than {max_regions} regions requested')
+        index, metrics = get_state_index(), get_state_metrics()
+        return {'states': {region: region_response(index, metrics, (region,))
+                           for region in regions}}
+    if path == '/counties':
+        keys = [parse_county(region)
+                for region in parameters.get('region', ())]
+        for state in parameters.get('state', ()):
+            counties = get_counties(state)
+            if not counties:
+                raise KeyError(state)
+            keys += [(state, county) for county in counties]
+        if len(keys) > max_regions:
+            raise ValueError(f'more than {max_regions} regions requested')
+        index, metrics = get_county_index(), get_county_metrics()
+        return {'counties': {
+            '/'.join(key): region_response(index, metrics, key)
+            for key in keys}}
+    if path == '/batch':
+        response = {}
+        for name, items in request:
+            if name == '/batch':
+                raise ValueError('batches cannot be nested')
+            response.update(query(name, items))
+        return response
+    raise KeyError(path)
+
+
+@memoize(maxsize=256)
+def render(path: str, request: tuple) -> tuple:
+    """
+    A function for serializing the response to a request, and compressing
+    it if it is large enough to be worth it. Responses are cached for the
+    version of the dataset they were rendered from, and only in one form:
+    gzipped unless they are small, so the cache holds a fraction of the
+    bytes of the json it serves.
+    :param path: the path of the request
+    :type path: str
+    :param request: the parameters of the request
+    :type request: tuple
+    :return: the body and whether it is gzipped
+    :rtype: tuple
+    """
+    body = json.dumps(query(path, request), separators=(',', ':')).encode()
+    if len(body) < min_gzip_size:
+        return body, False
+    return gzip.compress(body), True
+
+
+def freeze_request(parameters: dict) -> tuple:
+    """
+    A function for converting the parameters of a request into a hashable,
+    canonical form, so equal requests share a cache entry and an ETag.
+    :param parameters: the names of the parameters and their string values
+    or lists of string values
+    :type parameters: dict
+    :return: sorted pairs of names and tuples of values
+    :rtype: tuple
+    :raises ValueError: if a value is not a string or a list of strings
+    """
+    frozen = []
+    for name, values in sorted(parameters.items()):
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, (list, tuple)) or not all(
+                isinstance(value, str) for value in values):
+            raise ValueError(f'{name} must be a string or a list of strings')
+        frozen.append((name, tuple(values)))
+    return tuple(frozen)
+
+
+def freeze_batch(paths: dict) -> tuple:
+    """
+    A function for converting the paths and parameters of a batch request
+    into the canonical form of freeze_request.
+    :param paths: the paths and the parameters of each
+    :type paths: dict
+    :return: sorted pairs of paths and their frozen parameters
+    :rtype: tuple
+    :raises ValueError: if the parameters of a path are not a json object
+    """
+    frozen = []
+    for name, parameters in sorted(paths.items()):
+        if not isinstance(parameters, dict):
+            raise ValueError(f'the parameters of {name} must be a json '
+                             f'object')
+        frozen.append((f'/{name.lstrip("/")}', freeze_request(parameters)))
+    return tuple(frozen)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    A class that answers http requests for the series of the dataset
+    currently in use. Each request reads a single version of the dataset.
+    Responses carry an ETag of the data version and the request, so clients
+    repeating a request get a 304 until the data changes, and are gzipped
+    for clients that accept it.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/batch':
+            return self.send_json(
+                405, {'error': 'a batch must be posted as a json object'},
+                {'Allow': 'POST'})
+        self.answer(url.path, freeze_request(parse_qs(url.query)), True)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError('the Content-Length must not be negative')
+            if length > max_body_size:
+                # the unread body is discarded with the connection
+                return self.send_json(413, {
+                    'error': f'the body must be at most {max_body_size} '
+                             f'bytes'}, {'Connection': 'close'})
+            parameters = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(parameters, dict):
+                raise ValueError('the body must be a json object')
+            if path == '/batch':
+                request = freeze_batch(parameters)
+            else:
+                request = freeze_request(parameters)
+        except ValueError as error:
+            return self.send_json(400, {'error': str(error)})
+        self.answer(path, request, False)
+
+    def answer(self, path: str, request: tuple, conditional: bool) -> None:
+        """
+        A method for answering a request.
+        :param path: the path of the request
+        :type path: str
+        :param request: the parameters of the request
+        :type request: tuple
+        :param conditional: whether to honour If-None-Match
+        :type conditional: bool
+        """
+        with span(f'api{path}'), use_dataset() as dataset:
+            etag = '"{}"'.format(hashlib.sha256(repr(
+                (dataset.data_version, path, request)).encode()).hexdigest(
+            )[:32])
+            if conditional and etag in self.headers.get('If-None-Match', ''):
+                return self.send_body(304, b'', {'ETag': etag})
+            try:
+                body, compressed = render(path, request)
+            except KeyError as error:
+                return self.send_json(404, {'error': f'not found: {error}'})
+            except ValueError as error:
+                return self.send_json(400, {'error': str(error)})
+            except Exception:
+                logger.exception('failed to answer %s %r', path, request)
+                return self.send_json(500, {'error': 'internal error'})
+        headers = {'ETag': etag, 'Content-Type': 'application/json',
+                   'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if compressed:
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                headers['Content-Encoding'] = 'gzip'
+            else:
+                body = gzip.decompress(body)
+        self.send_body(200, body, headers)
+
+    def send_json(self, status: int, response: dict, headers=None) -> None:
+        """
+        A method for sending an uncached json response, such as an error.
+        :param status: the http status code
+        :type status: int
+        :param response: the response
+        :type response: dict
+        :param headers: further headers of the response
+        :type headers: dict
+        """
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        self.send_body(status, json.dumps(response).encode(), headers)
+
+    def send_body(self, status: int, body: bytes, headers: dict) -> None:
+        """
+        A method for sending a response.
+        :param status: the http status code
+        :type status: int
+        :param body: the body of the response
+        :type body: bytes
+        :param headers: the headers of the response
+        :type headers: dict
+        """
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start_api(api_port=None) -> ThreadingHTTPServer:
+    """
+    A function for serving the api from a background thread alongside the
+    app, on port COVID_API_PORT. Calling it again does nothing, and a port
+    of 0 disables the api.
+    :param api_port: the port to listen on
+    :type api_port: int
+    :return: the server, or None if the api is disabled
+    :rtype: ThreadingHTTPServer
+    """
+    global _server
+    api_port = port if api_port is None else api_port
+    with _server_lock:
+        if _server is None and api_port:
+            _server = ThreadingHTTPServer(('', api_port), ApiHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True,
+                             name='api').start()
+    return _server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the state, county and national series of the '
+                    'covid-19 data as json over http.')
+    parser.add_argument('--port', type=int, default=port or 8502)
+    args = parser.parse_args()
+    start_refresher()
+    prefetch()
+    server = ThreadingHTTPServer(('', args.port), ApiHandler)
+    server.daemon_threads = True
+    print(f'serving the api at http://localhost:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+from analysis_covid_19 import instrumentation
+from analysis_covid_19.dataframes.dataset import get_dataset
+from collections import OrderedDict
+import functools
+import threading
+
+memoized_functions = []
+
+
+def freeze(value):
+    """
+    A function for converting an argument into a hashable cache key, e.g.
+    the list of states selected in a multiselect widget becomes a tuple.
+    :param value: the argument
+    :return: a hashable version of the argument
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    return value
+
+
+def memoize(maxsize=32):
+    """
+    A decorator for caching the results of a function that reads the
+    covid-19 datasets. Results are keyed by the function's arguments and the
+    version of the dataset they were computed from; once a new version of
+    the dataset is in use, the results of older versions are discarded. At
+    most maxsize results are kept, evicting the least recently used. The
+    results are shared between sessions and must not be modified.
+    :param maxsize: the number of results to keep
+    :type maxsize: int
+    :return: the decorator
+    :rtype: callable
+    """
+
+    def decorator(function):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        stats = {'hits': 0, 'misses': 0, 'version': None}
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            version = get_dataset().version
+            key = (freeze(args), freeze(kwargs))
+            with lock:
+                if stats['version'] != version:
+                    cache.clear()
+                    stats['version'] = version
+                if key in cache:
+                    cache.move_to_end(key)
+                    stats['hits'] += 1
+                    return cache[key]
+                stats['misses'] += 1
+            value = function(*args, **kwargs)
+            with lock:
+                if stats['version'] == version:
+                    cache[key] = value
+                    while len(cache) > maxsize:
+                        cache.popitem(last=False)
+            return value
+
+        wrapper = instrumentation.timed()(wrapper)
+
+        def cache_info() -> dict:
+            with lock:
+                return {'hits': stats['hits'], 'misses': stats['misses'],
+                        'size': len(cache), 'maxsize': maxsize}
+
+        def cache_clear() -> None:
+            with lock:
+                cache.clear()
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        memoized_functions.append(wrapper)
+        return wrapper
+
+    return decorator
+
+
+def cache_info() -> dict:
+    """
+    A function for obtaining the hits, misses and size of the cache of every
+    memoized function.
+    :return: the cache statistics of each memoized function
+    :rtype: dict
+    """
+    return {f'{f.__module__}.{f.__name__}': f.cache_info()
+            for f in memoized_functions}
+
+
+def clear_caches() -> None:
+    """
+    A function for discarding the cached results of every memoized function.
+    """
+    for function in memoized_functions:
+        function.cache_clear()
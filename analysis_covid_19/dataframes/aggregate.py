@@ -0,0 +1,114 @@
+from analysis_covid_19.dataframes.county_dataframe import (
+    get_county_dataframe, get_state_fips)
+from analysis_covid_19.dataframes.state_dataframe import get_state_dataframe
+import argparse
+import numpy as np
+import pandas as pd
+
+columns = ['cases', 'deaths']
+
+
+def aggregate_counties(county_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    A function for building the state data from the county data by summing
+    the cases and deaths of the counties of each state on each date. The
+    rows are grouped with a single bincount over combined date and state
+    codes, and are returned in the order of the New York Time's csv file of
+    covid-19 data for US states: by date, then state.
+    :param county_df: a pandas dataframe of US county covid-19 data
+    :type county_df: pd.DataFrame
+    :return: a pandas dataframe of US state covid-19 data
+    :rtype: pd.DataFrame
+    """
+    dates, date_codes = np.unique(county_df['date'].values,
+                                  return_inverse=True)
+    state_codes, states = pd.factorize(county_df['state'], sort=True)
+    states = np.asarray(states, dtype=object)
+    keys, groups = np.unique(date_codes.astype('int64') * len(states) +
+                             state_codes, return_inverse=True)
+    state = keys % len(states)
+    if 'state_fips' in county_df:
+        fips = np.asarray(county_df['state_fips'].values, dtype='float64')
+    else:
+        fips = get_state_fips(county_df['fips'], county_df['state'])
+    by_state = np.full(len(states), np.nan)
+    known = ~np.isnan(fips)
+    by_state[state_codes[known]] = fips[known]
+    df = pd.DataFrame({'date': dates[keys // len(states)],
+                       'state': states[state],
+                       'fips': by_state[state]})
+    if not np.isnan(by_state).any():
+        df['fips'] = df['fips'].astype('int64')
+    for column in columns:
+        values = np.asarray(county_df[column].values, dtype='float64')
+        df[column] = np.bincount(groups, weights=np.nan_to_num(values),
+                                 minlength=len(keys)).round().astype('int64')
+    df['death_rate'] = df['deaths'] / df['cases'] * 100
+    return df
+
+
+def reconcile(derived: pd.DataFrame, state_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    A function for comparing the state data built from the county data with
+    the state data published in its own file.
+    :param derived: the state data built by aggregate_counties
+    :type derived: pd.DataFrame
+    :param state_df: the state data read from the state file
+    :type state_df: pd.DataFrame
+    :return: a pandas dataframe of the dates and states whose counts differ,
+    or that are in only one of the two, with the counts of each and their
+    differences
+    :rtype: pd.DataFrame
+    """
+    keys = ['date', 'state']
+    merged = pd.merge(derived[keys + columns], state_df[keys + columns],
+                      on=keys, how='outer', suffixes=('_counties', '_states'))
+    differs = np.zeros(len(merged), dtype=bool)
+    for column in columns:
+        merged[f'{column}_difference'] = (merged[f'{column}_counties'] -
+                                          merged[f'{column}_states'])
+        differs |= merged[f'{column}_difference'].fillna(1).values != 0
+    return merged[differs].sort_values(keys).reset_index(drop=True)
+
+
+def summarize(report: pd.DataFrame, rows: int) -> str:
+    """
+    A function for summarizing a reconciliation report.
+    :param report: a report returned by reconcile
+    :type report: pd.DataFrame
+    :param rows: the number of rows of the state data built from the county
+    data
+    :type rows: int
+    :return: the summary
+    :rtype: str
+    """
+    lines = [f'{len(report)} of {rows} state rows differ']
+    for column in columns:
+        difference = report[f'{column}_difference']
+        largest = difference.abs().max()
+        lines.append(f'{column}: largest difference '
+                     f'{0 if pd.isna(largest) else largest:,.0f}, '
+                     f'{difference.isna().sum()} rows in only one file')
+    latest = report[report['date'] == report['date'].max()]
+    if len(latest):
+        lines.append(f"states differing on {report['date'].max():%Y-%m-%d}: "
+                     f"{', '.join(latest['state'])}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the state data built from the county data with '
+                    'the state data published in its own file.')
+    parser.add_argument('--output', default=None,
+                        help='a csv file to write the rows that differ to')
+    args = parser.parse_args()
+    derived = aggregate_counties(get_county_dataframe())
+    report = reconcile(derived, get_state_dataframe())
+    print(summarize(report, len(derived)))
+    if args.output:
+        report.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,38 @@
 from pathlib import Path
+from analysis_covid_19 import instrumentation
+from analysis_covid_19.dataframes import fetch, shared
+from analysis_covid_19.dataframes.snapshot import (
+    frame_from_columns, load_snapshot)
+from analysis_covid_19.instrumentation import timed
+import numpy as np
 import pandas as pd
 import json
+import os
+import time
 
 abbreviation_path = Path(
     __file__).parent.parent.parent / 'state_abbreviations' / 'states.json'
 
 url = 'https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv'
 
+source = os.environ.get('COVID_COUNTY_SOURCE', url)
+
+compact = os.environ.get('COVID_COMPACT_DATA', '0') == '1'
+
+streaming = os.environ.get('COVID_STREAMING_INGEST', '0') == '1'
+
+chunk_rows = 100000
+
+csv_dtypes = {'date': object, 'county': object, 'state': object,
+              'fips': 'float64', 'cases': 'float64', 'deaths': 'float64'}
+
+# the dtype of each column of a streamed county dataframe; string columns
+# are held as categorical codes
+stream_dtypes = {'date': 'datetime64[ns]', 'county': 'int32',
+                 'state': 'int32', 'fips': 'float64', 'cases': 'int32',
+                 'deaths': 'float32', 'county_state': 'int32',
+                 'state_fips': 'float32', 'death_rate': 'float32'}
+
 
 def get_state_abbreviations() -> dict:
     """
@@ -20,39 +46,287 @@ def get_state_abbreviations() -> dict:
         return abbreviations
 
 
-def get_county_dataframe() -> pd.DataFrame:
+def label_counties(county, state) -> np.ndarray:
     """
-    A function for generating a pandas dataframe from the New York Time's
-    online csv file of covid-19 data for US counties. Each county in the
-    original dataset is amended to include the state abbreviation for clarity.
+    A function for amending county names with their state abbreviations,
+    e.g. 'Denver (CO)'. The labels are built once for each unique pair of
+    county and state and then broadcast to every row; pairs whose state has
+    no abbreviation are labelled 'Unknown'.
+    :param county: the county of each row
+    :type county: pd.Categorical
+    :param state: the state of each row
+    :type state: pd.Categorical
+    :return: an array of county names with state abbreviations
+    :rtype: np.ndarray
+    """
+    abbreviations = get_state_abbreviations()
+    county, state = pd.Categorical(county), pd.Categorical(state)
+    n_states = len(state.categories) + 1
+    pairs, uniques = pd.factorize(
+        county.codes.astype('int64') * n_states + state.codes + 1)
+    county_names = np.append(county.categories.values.astype(object),
+                             np.nan).take(uniques // n_states)
+    state_names = np.append(state.categories.values.astype(object),
+                            np.nan).take(uniques % n_states - 1)
+    labels = (pd.Series(county_names) + ' (' +
+              pd.Series(state_names).map(abbreviations) + ')').fillna(
+        'Unknown')
+    return labels.values.take(pairs)
+
+
+def get_state_fips(fips, state) -> np.ndarray:
+    """
+    A function for obtaining the two digit state FIPS code of each row from
+    the five digit county FIPS codes. Rows without a county FIPS code, such
+    as unknown counties, are given the code of the other counties in their
+    state.
+    :param fips: the county FIPS code of each row
+    :type fips: pd.Series
+    :param state: the state of each row
+    :type state: pd.Categorical
+    :return: an array of state FIPS codes
+    :rtype: np.ndarray
+    """
+    state = pd.Categorical(state)
+    fips = np.asarray(fips, dtype='float64')
+    known = ~np.isnan(fips)
+    by_state = np.full(len(state.categories) + 1, np.nan)
+    by_state[state.codes[known] + 1] = fips[known] // 1000
+    return by_state[state.codes + 1]
+
+
+def parse_county_data(buffer) -> pd.DataFrame:
+    """
+    A function for parsing the New York Time's csv file of covid-19 data for
+    US counties. Each county in the original dataset is amended to include
+    the state abbreviation for clarity, and each row is given its state's
+    FIPS code.
+    :param buffer: a file-like object containing the csv file
+    :type buffer: io.BytesIO
     :return: a pandas dataframe of US county covid-19 data
     :rtype: pd.DataFrame
     """
-    abbreviations = get_state_abbreviations()
-    df = pd.read_csv(url, parse_dates=['date'])
-    df['county_state'] = df['county'] + ' (' + df['state'].apply(
-        lambda x: abbreviations.get(x)) + ')'
-    df['county_state'].fillna('Unknown', inplace=True)
+    df = pd.read_csv(buffer, parse_dates=['date'])
+    state = pd.Categorical(df['state'])
+    df['county_state'] = label_counties(df['county'], state)
+    df['state_fips'] = get_state_fips(df['fips'], state)
     df['death_rate'] = df['deaths'] / df['cases'] * 100
     return df
 
 
-def get_counties(state) -> list:
+def count_rows(buffer) -> int:
+    """
+    A function for counting the rows of a csv file, less its header, without
+    parsing it. The file is read in chunks and left positioned where it was.
+    :param buffer: a binary file object containing the csv file
+    :type buffer: io.BufferedIOBase
+    :return: the number of rows
+    :rtype: int
+    """
+    start = buffer.tell()
+    lines, last = 0, b'\n'
+    for chunk in iter(lambda: buffer.read(fetch.chunk_size), b''):
+        lines += chunk.count(b'\n')
+        last = chunk[-1:]
+    buffer.seek(start)
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def encode_strings(values, lookup: dict) -> np.ndarray:
+    """
+    A function for converting strings to integer codes that are consistent
+    across chunks of a file. Strings not yet in the lookup are given the
+    next code, and missing values are given the code -1.
+    :param values: the strings to encode
+    :type values: np.ndarray
+    :param lookup: the code of each string seen so far, updated in place
+    :type lookup: dict
+    :return: an array of codes
+    :rtype: np.ndarray
+    """
+    codes, uniques = pd.factorize(values)
+    mapping = np.array([lookup.setdefault(value, len(lookup))
+                        for value in uniques] + [-1], dtype='int32')
+    return mapping[codes]
+
+
+def stream_county_data(buffer) -> pd.DataFrame:
+    """
+    A function for parsing the New York Time's csv file of covid-19 data for
+    US counties in chunks of chunk_rows rows, read with explicit dtypes.
+    Each chunk is enriched with its county_state labels, state FIPS codes
+    and death rates and copied into column buffers allocated once for the
+    whole file, so only one chunk of python strings is held at a time. The
+    dataframe returned has the columns of parse_county_data, with string
+    columns as categoricals and counts and rates in 32 bits.
+    :param buffer: a binary file object containing the csv file, which is
+    read in chunks rather than loaded into memory
+    :type buffer: io.BufferedIOBase
+    :return: a pandas dataframe of US county covid-19 data
+    :rtype: pd.DataFrame
+    """
+    start = time.perf_counter()
+    rows = count_rows(buffer)
+    columns = {name: np.empty(rows, dtype=dtype)
+               for name, dtype in stream_dtypes.items()}
+    lookups = {'county': {}, 'state': {}, 'county_state': {}}
+    by_state = np.full(0, np.nan)
+    position = 0
+    for chunk in pd.read_csv(buffer, dtype=csv_dtypes, chunksize=chunk_rows):
+        stop = position + len(chunk)
+        if stop > rows:
+            raise ValueError('the csv file has more rows than were counted')
+        block = slice(position, stop)
+        columns['date'][block] = pd.to_datetime(chunk['date'],
+                                                format='%Y-%m-%d').values
+        for name in ('county', 'state'):
+            columns[name][block] = encode_strings(chunk[name].values,
+                                                  lookups[name])
+        columns['county_state'][block] = encode_strings(
+            label_counties(chunk['county'], chunk['state']),
+            lookups['county_state'])
+        fips = chunk['fips'].values
+        state = columns['state'][block]
+        by_state = np.append(by_state, np.full(
+            len(lookups['state']) - len(by_state), np.nan))
+        known = ~np.isnan(fips) & (state >= 0)
+        by_state[state[known]] = fips[known] // 1000
+        columns['state_fips'][block] = np.append(by_state, np.nan)[state]
+        columns['fips'][block] = fips
+        cases = chunk['cases'].values
+        if np.isnan(cases).any():
+            raise ValueError('the csv file has rows without cases')
+        columns['cases'][block] = cases
+        deaths = chunk['deaths'].values
+        columns['deaths'][block] = deaths
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns['death_rate'][block] = deaths / cases * 100
+        position = stop
+    # rows of a state read before the first county of the state with a FIPS
+    # code are given the state's code once the whole file has been read
+    unresolved = np.isnan(columns['state_fips'][:position])
+    columns['state_fips'][:position][unresolved] = np.append(
+        by_state, np.nan)[columns['state'][:position][unresolved]]
+    data = {}
+    for name, values in columns.items():
+        values = values[:position] if position < rows else values
+        if name in lookups:
+            categories = list(lookups[name])
+            values = pd.Categorical.from_codes(
+                values, categories).reorder_categories(sorted(categories))
+        data[name] = values
+    # the numeric buffers become the columns of the dataframe as they are,
+    # since pandas 1.3 (see frame_from_columns); only the codes of the
+    # categorical columns are rewritten when their categories are sorted
+    df = frame_from_columns(data, position)
+    seconds = time.perf_counter() - start
+    if instrumentation.enabled:
+        instrumentation.record('stream_county_data', seconds, rows=position,
+                               rows_per_second=round(position / seconds))
+    return df
+
+
+def get_county_state(df: pd.DataFrame) -> pd.Series:
     """
-    A function to obtain a list of counties for the counties dataframe that
-    has been filtered by a state.
-    :param state: a state of interest
-    :type state: str
-    :return: a list of unique counties
-    :rtype: list
+    A function for obtaining the county names of a county dataframe amended
+    with their state abbreviations, e.g. 'Denver (CO)'. Compact dataframes
+    do not store these names, so they are built when requested.
+    :param df: a pandas dataframe of US county covid-19 data
+    :type df: pd.DataFrame
+    :return: a series of county names with state abbreviations
+    :rtype: pd.Series
     """
-    mask = county_df['state'] == state
-    filtered_df = county_df[mask]
-    return sorted(filtered_df['county'].unique())
+    if 'county_state' in df:
+        return df['county_state']
+    return pd.Series(label_counties(df['county'], df['state']),
+                     index=df.index, name='county_state')
+
+
+def compact_county_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    A function for reducing the memory used by a county dataframe. The state,
+    county and fips columns are stored as categoricals, the case and death
+    counts as 32 bit integers (or 32 bit floats if deaths are missing), the
+    state FIPS code and death rate as 32 bit floats, and the county_state
+    column is dropped; see get_county_state.
+    :param df: a pandas dataframe of US county covid-19 data
+    :type df: pd.DataFrame
+    :return: a compact pandas dataframe of US county covid-19 data
+    :rtype: pd.DataFrame
+    """
+    deaths = 'float32' if df['deaths'].isna().any() else 'int32'
+    return pd.DataFrame({
+        'date': df['date'],
+        'county': df['county'].astype('category'),
+        'state': df['state'].astype('category'),
+        'fips': df['fips'].astype('category'),
+        'state_fips': df['state_fips'].astype('float32'),
+        'cases': df['cases'].astype('int32'),
+        'deaths': df['deaths'].astype(deaths),
+        'death_rate': df['death_rate'].astype('float32')})
+
+
+def memory_footprint(df: pd.DataFrame) -> int:
+    """
+    A function for measuring the memory used by a dataframe, including the
+    python strings held by object columns.
+    :param df: a pandas dataframe
+    :type df: pd.DataFrame
+    :return: the number of bytes used
+    :rtype: int
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+@timed()
+def get_county_dataframe() -> pd.DataFrame:
+    """
+    A function for generating a pandas dataframe from the New York Time's
+    online csv file of covid-19 data for US counties. The csv file is only
+    downloaded and parsed when it has changed since the last snapshot of it
+    was written to disk. If the COVID_COMPACT_DATA environment variable is
+    set to 1, a compact dataframe is returned; see compact_county_dataframe.
+    If the COVID_STREAMING_INGEST environment variable is set to 1, the csv
+    file is parsed in chunks; see stream_county_data.
+    If the COVID_SHARED_DATA environment variable is set to 1, the snapshot
+    written by the loader process is attached to instead; see shared.attach.
+    :return: a pandas dataframe of US county covid-19 data
+    :rtype: pd.DataFrame
+    """
+    if shared.enabled:
+        return shared.attach('us-counties')
+    parser = stream_county_data if streaming else parse_county_data
+    df = load_snapshot('us-counties', source, parser, incremental=True,
+                       categorical=compact or streaming)
+    return compact_county_dataframe(df) if compact else df
+
+
+def refresh_county_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    A function for bringing a previously loaded county dataframe up to date.
+    Only the rows for dates after the latest date in the dataframe are
+    fetched, parsed and appended, unless the rows already loaded have been
+    revised in the csv file, in which case the whole file is reloaded.
+    :param df: a county dataframe returned by get_county_dataframe
+    :type df: pd.DataFrame
+    :return: a pandas dataframe of US county covid-19 data
+    :rtype: pd.DataFrame
+    """
+    if compact or streaming or shared.enabled:
+        return get_county_dataframe()
+    return load_snapshot('us-counties', source, parse_county_data,
+                         incremental=True, df=df)
 
 
-county_df = get_county_dataframe()
-states_and_territories_list = sorted(county_df['state'].unique())
 territories = {'District of Columbia', 'Guam', 'Northern Mariana Islands',
                'Puerto Rico', 'Virgin Islands'}
-states_list = sorted(set(states_and_territories_list).difference(territories))
+
+
+def __getattr__(name):
+    # county_df and the state lists are loaded lazily by the dataset module
+    if name in ('county_df', 'states_and_territories_list', 'states_list'):
+        from analysis_covid_19.dataframes.dataset import get_dataset
+        return getattr(get_dataset(), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
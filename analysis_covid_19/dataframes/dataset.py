@@ -0,0 +1,506 @@
+from analysis_covid_19.dataframes import state_dataframe
+from analysis_covid_19.dataframes.aggregate import aggregate_counties
+from analysis_covid_19.dataframes.county_dataframe import (
+    get_county_dataframe, memory_footprint, refresh_county_dataframe)
+from analysis_covid_19.dataframes.directory import load_directory
+from analysis_covid_19.dataframes.latest import county_labels
+from analysis_covid_19.dataframes.leaderboard import Leaderboard
+from analysis_covid_19.dataframes.matrix import CountyMatrix, load_matrix
+from analysis_covid_19.dataframes.metrics import (
+    NationalMetrics, RegionMetrics, RollingEngine)
+from analysis_covid_19.dataframes.population import (
+    get_county_populations, get_state_populations, region_populations)
+from analysis_covid_19.dataframes.region_index import RegionIndex
+from analysis_covid_19.dataframes.snapshot import snapshot_version
+from analysis_covid_19.instrumentation import span
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+import os
+import pandas as pd
+import threading
+import time
+
+refresh_interval = float(os.environ.get('COVID_REFRESH_INTERVAL', 3600))
+
+logger = logging.getLogger(__name__)
+
+
+class Dataset:
+    """
+    A class that holds one version of the covid-19 datasets. Nothing is
+    loaded when a dataset is created; each dataframe, and anything derived
+    from the dataframes, is computed the first time it is accessed and then
+    reused. Access is thread-safe, so the datasets can be loaded in
+    background threads while the page is rendered. A dataset created from a
+    previous one appends the rows added since to the previous county
+    dataframe rather than reloading it.
+    """
+
+    def __init__(self, version=0, previous=None):
+        self.version = version
+        self.previous = previous
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def derived(self, name: str, builder):
+        """
+        A method for obtaining a value computed from this dataset. The value
+        is built at most once, even when requested from several threads.
+        :param name: the name of the value
+        :type name: str
+        :param builder: a function that computes the value from the dataset
+        :type builder: callable
+        :return: the value
+        """
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                with span(f'dataset.{name}', version=self.version):
+                    self._values[name] = builder(self)
+        return self._values[name]
+
+    def is_loaded(self, name: str) -> bool:
+        """
+        A method for checking whether a value has already been computed.
+        :param name: the name of the value
+        :type name: str
+        :return: True if the value has been computed
+        :rtype: bool
+        """
+        return name in self._values
+
+    def memory_usage(self) -> dict:
+        """
+        A method for measuring the memory used by the loaded dataframes.
+        :return: the number of bytes used by each loaded dataframe
+        :rtype: dict
+        """
+        return {name: memory_footprint(self._values[name])
+                for name in ('county_df', 'state_df')
+                if name in self._values}
+
+    @property
+    def county_df(self) -> pd.DataFrame:
+        return self.derived('county_df', _county_dataframe)
+
+    @property
+    def state_df(self) -> pd.DataFrame:
+        return self.derived('state_df', _state_dataframe)
+
+    @property
+    def data_version(self) -> str:
+        return self.derived('data_version', _data_version)
+
+    @property
+    def county_index(self) -> RegionIndex:
+        return self.derived('county_index', lambda d: RegionIndex(
+            d.county_df, ['state', 'county']))
+
+    @property
+    def state_index(self) -> RegionIndex:
+        return self.derived('state_index',
+                            lambda d: RegionIndex(d.state_df, ['state']))
+
+    @property
+    def county_metrics(self) -> RegionMetrics:
+        return self.derived('county_metrics',
+                            lambda d: RegionMetrics(d.county_index))
+
+    @property
+    def state_metrics(self) -> RegionMetrics:
+        return self.derived('state_metrics',
+                            lambda d: RegionMetrics(d.state_index))
+
+    @property
+    def county_rolling(self) -> RollingEngine:
+        return self.derived('county_rolling', lambda d: RollingEngine(
+            d.county_metrics, region_populations(d.county_index,
+                                                 get_county_populations())))
+
+    @property
+    def state_rolling(self) -> RollingEngine:
+        return self.derived('state_rolling', lambda d: RollingEngine(
+            d.state_metrics, region_populations(d.state_index,
+                                                get_state_populations())))
+
+    @property
+    def county_latest(self) -> Leaderboard:
+        return self.derived('county_latest', _county_latest)
+
+    @property
+    def state_latest(self) -> Leaderboard:
+        return self.derived('state_latest',
+                            lambda d: Leaderboard(d.state_index))
+
+    @property
+    def county_matrix(self) -> CountyMatrix:
+        return self.derived('county_matrix', lambda d: load_matrix(
+            d.data_version, lambda: d.county_index))
+
+    @property
+    def national_metrics(self) -> NationalMetrics:
+        return self.derived('national_metrics',
+                            lambda d: NationalMetrics(d.state_index))
+
+    @property
+    def directory(self) -> dict:
+        return self.derived('directory', lambda d: load_directory(
+            d.data_version, lambda: d.county_index))
+
+    @property
+    def states_and_territories_list(self) -> list:
+        return self.directory['states_and_territories']
+
+    @property
+    def states_list(self) -> list:
+        return self.directory['states']
+
+
+def _county_dataframe(dataset: Dataset) -> pd.DataFrame:
+    previous = dataset.previous
+    if previous is not None and previous.is_loaded('county_df'):
+        return refresh_county_dataframe(previous.county_df)
+    return get_county_dataframe()
+
+
+def _county_latest(dataset: Dataset) -> Leaderboard:
+    # a refreshed county dataframe usually only has the latest day of rows
+    # appended, so the previous table is extended with those rows
+    previous = dataset.previous
+    if previous is not None and previous.is_loaded('county_latest'):
+        latest = previous.county_latest.extended(dataset.county_df)
+        if latest is not None:
+            return latest
+    return Leaderboard(dataset.county_index, county_labels)
+
+
+def _state_dataframe(dataset: Dataset) -> pd.DataFrame:
+    # with COVID_DERIVE_STATES=1 the state file is not fetched; the state
+    # data, and so the national data, is summed from the county data instead
+    if state_dataframe.from_counties:
+        return aggregate_counties(dataset.county_df)
+    return state_dataframe.get_state_dataframe()
+
+
+def _data_version(dataset: Dataset) -> str:
+    # the snapshots are identified after the dataframes have been loaded from
+    # them, so the version describes the data this dataset holds
+    _build_concurrently(dataset, [['county_df'], ['state_df']])
+    return snapshot_version('us-counties', 'us-states')
+
+
+_dataset = Dataset()
+_local = threading.local()
+_prefetch_threads = []
+_prefetch_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+ny_nj = frozenset(['New York', 'New Jersey'])
+
+prefetch_state_names = ['state_df', 'state_index', 'state_metrics',
+                        'state_rolling', 'state_latest',
+                        'national_metrics']
+prefetch_county_names = ['county_df', 'county_index', 'directory',
+                         'county_latest', 'county_metrics', 'county_matrix']
+
+
+def get_dataset() -> Dataset:
+    """
+    A function for obtaining the current version of the covid-19 datasets,
+    or the version pinned to the current thread by use_dataset.
+    :return: the current dataset
+    :rtype: Dataset
+    """
+    return getattr(_local, 'dataset', None) or _dataset
+
+
+@contextmanager
+def use_dataset(dataset=None):
+    """
+    A context manager for pinning a version of the datasets to the current
+    thread, so that a run of the app reads a single version even if a newer
+    one is swapped in part way through.
+    :param dataset: the dataset to pin, by default the current dataset
+    :type dataset: Dataset
+    """
+    previous = getattr(_local, 'dataset', None)
+    _local.dataset = dataset or get_dataset()
+    try:
+        yield _local.dataset
+    finally:
+        _local.dataset = previous
+
+
+def get_county_df() -> pd.DataFrame:
+    """
+    A function for obtaining the dataframe of US county covid-19 data,
+    loading it on first use.
+    :return: a pandas dataframe of US county covid-19 data
+    :rtype: pd.DataFrame
+    """
+    return get_dataset().county_df
+
+
+def get_state_df() -> pd.DataFrame:
+    """
+    A function for obtaining the dataframe of US state covid-19 data,
+    loading it on first use.
+    :return: a pandas dataframe of US state covid-19 data
+    :rtype: pd.DataFrame
+    """
+    return get_dataset().state_df
+
+
+def get_county_index() -> RegionIndex:
+    """
+    A function for obtaining the index of the county dataframe by state and
+    county, building it on first use.
+    :return: the county region index
+    :rtype: RegionIndex
+    """
+    return get_dataset().county_index
+
+
+def get_state_index() -> RegionIndex:
+    """
+    A function for obtaining the index of the state dataframe by state,
+    building it on first use.
+    :return: the state region index
+    :rtype: RegionIndex
+    """
+    return get_dataset().state_index
+
+
+def get_county_metrics() -> RegionMetrics:
+    """
+    A function for obtaining the daily metrics of every county, computing
+    them on first use.
+    :return: the county metrics
+    :rtype: RegionMetrics
+    """
+    return get_dataset().county_metrics
+
+
+def get_state_metrics() -> RegionMetrics:
+    """
+    A function for obtaining the daily metrics of every state, computing
+    them on first use.
+    :return: the state metrics
+    :rtype: RegionMetrics
+    """
+    return get_dataset().state_metrics
+
+
+def get_county_rolling() -> RollingEngine:
+    """
+    A function for obtaining the rolling metrics engine of the counties,
+    building it on first use.
+    :return: the county rolling metrics engine
+    :rtype: RollingEngine
+    """
+    return get_dataset().county_rolling
+
+
+def get_state_rolling() -> RollingEngine:
+    """
+    A function for obtaining the rolling metrics engine of the states,
+    building it on first use.
+    :return: the state rolling metrics engine
+    :rtype: RollingEngine
+    """
+    return get_dataset().state_rolling
+
+
+def get_county_latest() -> Leaderboard:
+    """
+    A function for obtaining the latest cases and deaths of every county,
+    which can be ranked, building the table on first use.
+    :return: the latest county snapshot
+    :rtype: Leaderboard
+    """
+    return get_dataset().county_latest
+
+
+def get_state_latest() -> Leaderboard:
+    """
+    A function for obtaining the latest cases and deaths of every state,
+    which can be ranked, building the table on first use.
+    :return: the latest state snapshot
+    :rtype: Leaderboard
+    """
+    return get_dataset().state_latest
+
+
+def get_county_matrix() -> CountyMatrix:
+    """
+    A function for obtaining the dense dates by counties matrices of
+    cumulative and daily cases and deaths, building them on first use.
+    :return: the county matrices
+    :rtype: CountyMatrix
+    """
+    return get_dataset().county_matrix
+
+
+def get_national_metrics(include_ny_nj=True, excluded_states=()) -> \
+        pd.DataFrame:
+    """
+    A function for obtaining the daily metrics of the US, computing them on
+    first use.
+    :param include_ny_nj: whether to include New York and New Jersey
+    :type include_ny_nj: bool
+    :param excluded_states: other states and territories to exclude
+    :type excluded_states: list
+    :return: a dataframe of new_cases, new_cases_avg, new_deaths and
+    new_deaths_avg indexed by date
+    :rtype: pd.DataFrame
+    """
+    excluded = frozenset(excluded_states)
+    if not include_ny_nj:
+        excluded |= ny_nj
+    return get_dataset().national_metrics.lookup(excluded)
+
+
+def get_states_and_territories_list() -> list:
+    """
+    A function for obtaining a sorted list of the US states and territories
+    in the county dataset.
+    :return: a list of states and territories
+    :rtype: list
+    """
+    return get_dataset().states_and_territories_list
+
+
+def get_states_list() -> list:
+    """
+    A function for obtaining a sorted list of the US states (and territories
+    that are not in the territories set) in the county dataset.
+    :return: a list of states
+    :rtype: list
+    """
+    return get_dataset().states_list
+
+
+def get_counties(state) -> list:
+    """
+    A function to obtain a sorted list of the counties of a state in the
+    county dataset.
+    :param state: a state of interest
+    :type state: str
+    :return: a list of unique counties
+    :rtype: list
+    """
+    return get_dataset().directory['counties'].get(state, [])
+
+
+def get_county_fips(county, state):
+    """
+    A function to obtain the FIPS code of a county.
+    :param county: the county of interest
+    :type county: str
+    :param state: the state of the county
+    :type state: str
+    :return: the FIPS code, or None if the county has none
+    :rtype: int
+    """
+    return get_dataset().directory['fips'].get(state, {}).get(county)
+
+
+def _build(dataset: Dataset, names: list) -> None:
+    for name in names:
+        getattr(dataset, name)
+
+
+def _build_concurrently(dataset: Dataset, groups: list) -> None:
+    # each group of values is built in its own thread, so the county and
+    # state sources are fetched at the same time; errors are raised here
+    with ThreadPoolExecutor(len(groups)) as pool:
+        for future in [pool.submit(_build, dataset, names)
+                       for names in groups]:
+            future.result()
+
+
+def prefetch() -> list:
+    """
+    A function for loading the county and state dataframes, and computing
+    their indexes and metrics, in background threads. Calling it again while
+    the loads are running, or after they have finished, does nothing.
+    :return: the background threads
+    :rtype: list
+    """
+    dataset = get_dataset()
+    with _prefetch_lock:
+        if not any(t.is_alive() for t in _prefetch_threads):
+            _prefetch_threads.clear()
+            for names in (prefetch_state_names, prefetch_county_names):
+                if not dataset.is_loaded(names[-1]):
+                    thread = threading.Thread(
+                        target=_build, args=(dataset, names), daemon=True,
+                        name=f'prefetch-{names[0]}')
+                    thread.start()
+                    _prefetch_threads.append(thread)
+    return list(_prefetch_threads)
+
+
+def refresh() -> bool:
+    """
+    A function for loading a new version of the datasets and swapping it in
+    place of the current version. Only the dataframes are loaded to tell
+    whether the data has changed; if it has not, the current version is
+    kept and nothing is derived from them. Otherwise every value the app
+    uses is built before the swap, so readers see either the old version or
+    the fully loaded new one.
+    :return: True if a new version was swapped in
+    :rtype: bool
+    """
+    global _dataset
+    with _refresh_lock:
+        current = _dataset
+        candidate = Dataset(current.version + 1, previous=current)
+        if (current.is_loaded('data_version') and
+                candidate.data_version == current.data_version):
+            return False
+        _build_concurrently(candidate, [prefetch_state_names,
+                                        prefetch_county_names])
+        candidate.previous = None
+        _dataset = candidate
+        return True
+
+
+def _refresh_periodically(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            with span('refresh'):
+                refresh()
+        except Exception:
+            logger.exception('refreshing the covid-19 datasets failed')
+
+
+def start_refresher(interval=None) -> threading.Thread:
+    """
+    A function for starting a background thread that refreshes the datasets
+    every COVID_REFRESH_INTERVAL seconds (by default an hour). Calling it
+    again does nothing, and an interval of 0 disables the refresher.
+    :param interval: the seconds between refreshes
+    :type interval: float
+    :return: the refresher thread, or None if it is disabled
+    :rtype: threading.Thread
+    """
+    global _refresher
+    interval = refresh_interval if interval is None else interval
+    with _refresher_lock:
+        if _refresher is None and interval > 0:
+            _refresher = threading.Thread(
+                target=_refresh_periodically, args=(interval,), daemon=True,
+                name='refresher')
+            _refresher.start()
+    return _refresher
@@ -0,0 +1,67 @@
+from analysis_covid_19.dataframes import snapshot
+from analysis_covid_19.dataframes.county_dataframe import territories
+from analysis_covid_19.dataframes.region_index import RegionIndex
+import json
+import numpy as np
+import os
+
+
+def build_directory(index: RegionIndex) -> dict:
+    """
+    A function for building a directory of the regions in the county data:
+    the sorted counties of each state, the FIPS code of each county and the
+    sorted lists of states and territories.
+    :param index: the county region index
+    :type index: RegionIndex
+    :return: the directory
+    :rtype: dict
+    """
+    regions = index.regions()
+    fips = np.asarray(index.df['fips'].values[index.order[index.starts]],
+                      dtype='float64')
+    counties = {}
+    county_fips = {}
+    for (state, county), code in zip(regions, fips):
+        counties.setdefault(state, []).append(county)
+        county_fips.setdefault(state, {})[county] = (
+            None if np.isnan(code) else int(code))
+    for state_counties in counties.values():
+        state_counties.sort()
+    states_and_territories = sorted(counties)
+    return {'counties': counties, 'fips': county_fips,
+            'states_and_territories': states_and_territories,
+            'states': sorted(set(states_and_territories).difference(
+                territories))}
+
+
+def load_directory(data_version: str, get_index) -> dict:
+    """
+    A function for obtaining the directory of a version of the county data.
+    The directory is stored alongside the snapshots so that other processes
+    serving the same data can read it instead of building it.
+    :param data_version: the version of the data
+    :type data_version: str
+    :param get_index: a function returning the county region index, called
+    only if the directory has to be built
+    :type get_index: callable
+    :return: the directory
+    :rtype: dict
+    """
+    path = snapshot.snapshot_path / 'directory.json'
+    try:
+        with open(path) as fp:
+            stored = json.load(fp)
+        if stored['data_version'] == data_version:
+            return stored['directory']
+    except (OSError, ValueError, KeyError):
+        pass
+    directory = build_directory(get_index())
+    try:
+        temporary = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(temporary, 'w') as fp:
+            json.dump({'data_version': data_version,
+                       'directory': directory}, fp)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+    return directory
@@ -0,0 +1,88 @@
+from requests.adapters import HTTPAdapter
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import requests
+
+connect_timeout = float(os.environ.get('COVID_FETCH_CONNECT_TIMEOUT', 10))
+
+read_timeout = float(os.environ.get('COVID_FETCH_TIMEOUT', 60))
+
+retries = int(os.environ.get('COVID_FETCH_RETRIES', 3))
+
+backoff = float(os.environ.get('COVID_FETCH_BACKOFF', 0.5))
+
+retry_statuses = {429, 500, 502, 503, 504}
+
+chunk_size = 2 ** 20
+
+pool_size = 8
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    A function for obtaining the http session shared by every fetch, so that
+    connections to a host are pooled and kept alive between requests and
+    across threads.
+    :return: the shared session
+    :rtype: requests.Session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Accept-Encoding'] = 'gzip, deflate'
+            _session = session
+        return _session
+
+
+def get(url: str, headers=None) -> tuple:
+    """
+    A function for requesting a url over the shared session. The body is
+    read in chunks as it arrives, decompressed if the server sent it gzipped,
+    hashed and written to a temporary file, so it is never held in memory
+    as a whole. Connection errors, timeouts and responses
+    with a status in retry_statuses are retried up to COVID_FETCH_RETRIES
+    times, waiting COVID_FETCH_BACKOFF seconds and then twice as long after
+    each attempt.
+    :param url: the url to request
+    :type url: str
+    :param headers: further headers to send
+    :type headers: dict
+    :return: the response, a temporary file holding its body (positioned at
+    its start, and removed once closed) and the sha256 of the body
+    :rtype: tuple
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = get_session().get(
+                url, headers=headers, stream=True,
+                timeout=(connect_timeout, read_timeout))
+            if response.status_code not in retry_statuses or \
+                    attempt == retries:
+                digest = hashlib.sha256()
+                body = tempfile.TemporaryFile()
+                try:
+                    for chunk in response.iter_content(chunk_size):
+                        digest.update(chunk)
+                        body.write(chunk)
+                except BaseException:
+                    body.close()
+                    raise
+                body.seek(0)
+                return response, body, digest.hexdigest()
+            response.close()
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
@@ -0,0 +1,199 @@
+from analysis_covid_19.dataframes.county_dataframe import label_counties
+from analysis_covid_19.dataframes.region_index import RegionIndex
+import copy
+import numpy as np
+import pandas as pd
+import zlib
+
+
+def region_keys(df: pd.DataFrame, rows: np.ndarray, keys: list) -> list:
+    """
+    A function for identifying the region of each of a set of rows by its
+    FIPS code. Rows without a FIPS code, such as unknown counties, are
+    identified by their state, or state and county, instead.
+    :param df: a covid-19 dataframe with a fips column
+    :type df: pd.DataFrame
+    :param rows: the row positions of interest
+    :type rows: np.ndarray
+    :param keys: the columns naming the region, e.g. ['state', 'county']
+    :type keys: list
+    :return: a list of FIPS codes and region names
+    :rtype: list
+    """
+    fips = np.asarray(df['fips'].values[rows], dtype='float64')
+    names = zip(*[df[key].values[rows] for key in keys])
+    return [name if np.isnan(code) else int(code)
+            for code, name in zip(fips, names)]
+
+
+def fingerprint(df: pd.DataFrame, rows: int) -> int:
+    """
+    A function for computing a checksum of the dates, cases and deaths of
+    the first rows of a dataframe, used to check that rows already held
+    have not been revised.
+    :param df: a covid-19 dataframe
+    :type df: pd.DataFrame
+    :param rows: the number of rows to include
+    :type rows: int
+    :return: the checksum
+    :rtype: int
+    """
+    checksum = 0
+    for column in ('date', 'cases', 'deaths'):
+        values = np.ascontiguousarray(df[column].values[:rows])
+        checksum = zlib.crc32(values.view('uint8'), checksum)
+    return checksum
+
+
+def county_labels(df: pd.DataFrame, rows: np.ndarray) -> np.ndarray:
+    """
+    A function for labelling counties with their state abbreviations, e.g.
+    'Denver (CO)', so that counties of the same name are told apart.
+    :param df: a county dataframe
+    :type df: pd.DataFrame
+    :param rows: the row positions of interest
+    :type rows: np.ndarray
+    :return: an array of county labels
+    :rtype: np.ndarray
+    """
+    return label_counties(df['county'].values[rows], df['state'].values[rows])
+
+
+def state_labels(df: pd.DataFrame, rows: np.ndarray) -> np.ndarray:
+    """
+    A function for labelling states with their names.
+    :param df: a state dataframe
+    :type df: pd.DataFrame
+    :param rows: the row positions of interest
+    :type rows: np.ndarray
+    :return: an array of state names
+    :rtype: np.ndarray
+    """
+    return np.asarray(df['state'].values[rows], dtype=object)
+
+
+class LatestSnapshot:
+    """
+    A class that holds the latest row of each region of a covid-19
+    dataframe, keyed by FIPS code, with the date it was reported on, since
+    not every region reports every day. The table is built once per version
+    of the dataframe from its region index; when rows are appended to the
+    dataframe, a new table is made from this one and the appended rows
+    alone.
+    """
+
+    def __init__(self, index: RegionIndex, labeller=state_labels):
+        self.keys = index.keys
+        self.labeller = labeller
+        self.positions = {}
+        self.labels = np.empty(0, dtype=object)
+        self.unknown = np.empty(0, dtype=bool)
+        self.dates = np.empty(0, dtype='datetime64[ns]')
+        self.cases = np.empty(0)
+        self.deaths = np.empty(0)
+        self._add(index.df, index.order[index.stops - 1])
+        self.rows = len(index.df)
+        self.fingerprint = fingerprint(index.df, self.rows)
+
+    def _add(self, df: pd.DataFrame, rows: np.ndarray) -> None:
+        """
+        A method for updating the entries of the regions of a set of rows
+        with the rows that are not older than the entries.
+        :param df: the covid-19 dataframe
+        :type df: pd.DataFrame
+        :param rows: the row positions to add
+        :type rows: np.ndarray
+        """
+        dates = df['date'].values[rows]
+        rows = rows[np.argsort(dates, kind='stable')]
+        keys = region_keys(df, rows, self.keys)
+        for key in keys:
+            self.positions.setdefault(key, len(self.positions))
+        grow = len(self.positions) - len(self.labels)
+        if grow:
+            self.labels = np.append(self.labels, np.full(grow, None))
+            self.unknown = np.append(self.unknown, np.zeros(grow, bool))
+            self.dates = np.append(self.dates, np.full(
+                grow, np.datetime64(0, 'ns')))
+            self.cases = np.append(self.cases, np.full(grow, np.nan))
+            self.deaths = np.append(self.deaths, np.full(grow, np.nan))
+        positions = np.array([self.positions[key] for key in keys],
+                             dtype='int64')
+        newer = df['date'].values[rows] >= self.dates[positions]
+        rows, positions = rows[newer], positions[newer]
+        # rows are in date order, so the latest row of each region is
+        # assigned last and kept
+        self.labels[positions] = self.labeller(df, rows)
+        self.unknown[positions] = (
+            np.asarray(df[self.keys[-1]].values[rows], dtype=object) ==
+            'Unknown')
+        self.dates[positions] = df['date'].values[rows]
+        self.cases[positions] = df['cases'].values[rows]
+        self.deaths[positions] = df['deaths'].values[rows]
+
+    def extended(self, df: pd.DataFrame):
+        """
+        A method for making the table of a dataframe that has had rows
+        appended to the one this table was made from. This table is not
+        modified.
+        :param df: the covid-19 dataframe with the appended rows
+        :type df: pd.DataFrame
+        :return: the new table, or None if the rows already held have been
+        revised and the table must be rebuilt
+        :rtype: LatestSnapshot
+        """
+        if len(df) < self.rows or fingerprint(df, self.rows) != \
+                self.fingerprint:
+            return None
+        latest = copy.copy(self)
+        latest.positions = dict(self.positions)
+        for name in ('labels', 'unknown', 'dates', 'cases', 'deaths'):
+            setattr(latest, name, getattr(self, name).copy())
+        latest._add(df, np.arange(self.rows, len(df)))
+        latest.rows = len(df)
+        latest.fingerprint = fingerprint(df, len(df))
+        return latest
+
+    @property
+    def latest_date(self) -> pd.Timestamp:
+        return pd.Timestamp(self.dates.max()) if len(self.dates) else pd.NaT
+
+    def table(self, latest_only=False) -> pd.DataFrame:
+        """
+        A method for obtaining the latest row of each region as a dataframe.
+        :param latest_only: whether to include only regions reported on the
+        latest date
+        :type latest_only: bool
+        :return: a pandas dataframe of the date, cases and deaths of each
+        region indexed by region label
+        :rtype: pd.DataFrame
+        """
+        table = pd.DataFrame({'date': self.dates, 'cases': self.cases,
+                              'deaths': self.deaths},
+                             index=pd.Index(self.labels, name='region'))
+        if latest_only:
+            return table[self.reported_latest()]
+        return table
+
+    def reported_latest(self) -> np.ndarray:
+        """
+        A method for finding the regions reported on the latest date.
+        :return: a boolean array, True for each region reported on it
+        :rtype: np.ndarray
+        """
+        if not len(self.dates):
+            return np.zeros(0, dtype=bool)
+        return self.dates == self.dates.max()
+
+    def totals(self, latest_only=True) -> dict:
+        """
+        A method for summing the latest cases and deaths of the regions.
+        :param latest_only: whether to include only regions reported on the
+        latest date
+        :type latest_only: bool
+        :return: the total cases and deaths
+        :rtype: dict
+        """
+        mask = self.reported_latest() if latest_only else slice(None)
+        return {column: int(np.nansum(getattr(self, column)[mask]))
+                for column in ('cases', 'deaths')}
@@ -0,0 +1,58 @@
+from analysis_covid_19.dataframes.latest import LatestSnapshot
+import numpy as np
+import pandas as pd
+
+
+class Leaderboard(LatestSnapshot):
+    """
+    A class that ranks the regions of a covid-19 dataframe by their latest
+    cases, deaths and death rate. A ranking is a partial selection over the
+    latest row of each region, a few thousand entries, rather than a
+    groupby of the whole history.
+    """
+
+    def top(self, column='cases', n=10, include_unknown=True, min_cases=0,
+            latest_only=False) -> pd.Series:
+        """
+        A method for obtaining the n regions with the largest values of a
+        metric, in descending order.
+        :param column: 'cases', 'deaths' or 'death_rate'
+        :type column: str
+        :param n: the number of regions to include
+        :type n: int
+        :param include_unknown: whether to include unknown counties
+        :type include_unknown: bool
+        :param min_cases: the number of cases a region must exceed to be
+        included
+        :type min_cases: int
+        :param latest_only: whether to include only regions reported on the
+        latest date
+        :type latest_only: bool
+        :return: a pandas series of the values indexed by region label
+        :rtype: pd.Series
+        """
+        if column == 'death_rate':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = self.deaths / self.cases * 100
+        elif column in ('cases', 'deaths'):
+            values = getattr(self, column)
+        else:
+            raise ValueError(f'unknown leaderboard column {column!r}')
+        eligible = ~np.isnan(values) & (self.cases > min_cases)
+        if not include_unknown:
+            eligible &= ~self.unknown
+        if latest_only:
+            eligible &= self.reported_latest()
+        candidates = np.flatnonzero(eligible)
+        values = values[candidates]
+        labels = self.labels[candidates]
+        if 0 < n < len(candidates):
+            # every region tied with the nth is kept so that ties are broken
+            # by label rather than by the order the regions were added
+            nth = values[np.argpartition(-values, n - 1)[n - 1]]
+            selected = np.flatnonzero(values >= nth)
+        else:
+            selected = np.arange(len(candidates))
+        selected = sorted(selected, key=lambda i: (-values[i], labels[i]))[:n]
+        return pd.Series(values[selected], index=labels[selected],
+                         name=column)
@@ -0,0 +1,251 @@
+from analysis_covid_19.dataframes import snapshot
+from analysis_covid_19.dataframes.latest import county_labels
+from analysis_covid_19.dataframes.region_index import RegionIndex
+import json
+import numpy as np
+import os
+
+stored = os.environ.get('COVID_MATRIX_MMAP', '0') == '1'
+
+columns = ['cases', 'deaths', 'new_cases', 'new_deaths']
+
+dtype = 'int32'
+
+
+def fill_forward(values: np.ndarray, reported: np.ndarray) -> np.ndarray:
+    """
+    A function for carrying the last reported value of each column of a
+    matrix forward over the dates it was not reported on. Dates before a
+    column's first report are filled with 0.
+    :param values: a dates by regions matrix of values
+    :type values: np.ndarray
+    :param reported: whether each value was reported
+    :type reported: np.ndarray
+    :return: the filled matrix
+    :rtype: np.ndarray
+    """
+    last = np.where(reported, np.arange(len(values))[:, None], -1)
+    np.maximum.accumulate(last, axis=0, out=last)
+    filled = np.take_along_axis(values, np.maximum(last, 0), axis=0)
+    filled[last < 0] = 0
+    return filled
+
+
+def build_matrix(index: RegionIndex) -> dict:
+    """
+    A function for building dense dates by counties matrices of cumulative
+    cases and deaths, and their daily differences, from the county region
+    index. There is one row for every date from the first to the latest in
+    the county data and one column for every FIPS code; counties without a
+    FIPS code, such as unknown counties, are left out. A county's counts are
+    carried forward over dates it did not report, so the daily differences
+    of those dates are 0.
+    :param index: the county region index
+    :type index: RegionIndex
+    :return: the first date, the FIPS code and label of each column, and a
+    matrix for each of columns
+    :rtype: dict
+    """
+    df = index.df
+    first_rows = index.order[index.starts]
+    region_fips = np.asarray(df['fips'].values[first_rows], dtype='float64')
+    known = ~np.isnan(region_fips)
+    fips, first, region_columns = np.unique(
+        region_fips[known].astype('int64'), return_index=True,
+        return_inverse=True)
+    column_of_region = np.full(len(region_fips), -1, dtype='int64')
+    column_of_region[known] = region_columns
+    column = np.repeat(column_of_region, index.stops - index.starts)
+    rows = index.order[column >= 0]
+    column = column[column >= 0]
+    day = df['date'].values[rows].astype('datetime64[D]')
+    start = day.min() if len(day) else np.datetime64('today', 'D')
+    date = (day - start).astype('int64')
+    shape = (int(date.max(initial=-1)) + 1, len(fips))
+    matrices = {}
+    for name in ('cases', 'deaths'):
+        values = np.asarray(df[name].values[rows], dtype='float64')
+        valid = ~np.isnan(values)
+        dense = np.zeros(shape)
+        reported = np.zeros(shape, dtype=bool)
+        dense[date[valid], column[valid]] = values[valid]
+        reported[date[valid], column[valid]] = True
+        cumulative = fill_forward(dense, reported).astype(dtype)
+        matrices[name] = cumulative
+        matrices[f'new_{name}'] = np.diff(
+            cumulative, axis=0, prepend=np.zeros((1, shape[1]), dtype=dtype))
+    labels = county_labels(df, first_rows[known][first])
+    return {'start': start, 'fips': fips, 'labels': list(labels),
+            'matrices': matrices}
+
+
+class CountyMatrix:
+    """
+    A class that holds dense dates by counties matrices of cumulative cases
+    and deaths, and their daily differences, so that every county on a date
+    is a row of a matrix and every date of a county is a column. Rows and
+    columns are looked up by arithmetic and a dictionary, and returned as
+    views of the contiguous matrices, which may be memory mapped. The
+    matrices are shared and must not be modified.
+    """
+
+    def __init__(self, start, fips: np.ndarray, labels: list,
+                 matrices: dict):
+        self.start = np.datetime64(start, 'D')
+        self.fips = fips
+        self.labels = labels
+        self.matrices = matrices
+        self.columns = {int(code): i for i, code in enumerate(fips)}
+        self.dates = self.start + np.arange(len(matrices['cases']))
+
+    @property
+    def latest_date(self) -> np.datetime64:
+        # the matrices have no rows when no county has a FIPS code
+        return self.dates[-1] if len(self.dates) else None
+
+    def position(self, date) -> int:
+        """
+        A method for obtaining the row of a date.
+        :param date: the date of interest
+        :type date: datetime
+        :return: the row of the date in the matrices
+        :rtype: int
+        """
+        position = int((np.datetime64(date, 'D') - self.start).astype(
+            'int64'))
+        if not 0 <= position < len(self.dates):
+            raise KeyError(f'{date} is not in the county data')
+        return position
+
+    def row(self, date, column='cases') -> np.ndarray:
+        """
+        A method for obtaining the values of every county on a date.
+        :param date: the date of interest
+        :type date: datetime
+        :param column: one of columns
+        :type column: str
+        :return: the value of each county, in the order of self.fips
+        :rtype: np.ndarray
+        """
+        return self.matrices[column][self.position(date)]
+
+    def series(self, fips: int, column='cases') -> np.ndarray:
+        """
+        A method for obtaining the values of a county on every date.
+        :param fips: the FIPS code of the county
+        :type fips: int
+        :param column: one of columns
+        :type column: str
+        :return: the value on each date, in the order of self.dates
+        :rtype: np.ndarray
+        """
+        return self.matrices[column][:, self.columns[fips]]
+
+    def window(self, date, column='cases', days=7) -> np.ndarray:
+        """
+        A method for obtaining the average daily new cases or deaths of
+        every county over the window of days ending on a date, computed
+        from two rows of the cumulative matrix.
+        :param date: the last date of the window
+        :type date: datetime
+        :param column: cases or deaths
+        :type column: str
+        :param days: the number of days in the window
+        :type days: int
+        :return: the average of each county, in the order of self.fips
+        :rtype: np.ndarray
+        """
+        position = self.position(date)
+        cumulative = self.matrices[column]
+        latest = cumulative[position].astype('float64')
+        if position < days:
+            return latest / days
+        return (latest - cumulative[position - days]) / days
+
+
+def read_matrix(data_version: str):
+    """
+    A function for memory mapping the matrices stored for a version of the
+    county data.
+    :param data_version: the version of the data
+    :type data_version: str
+    :return: the matrices, or None if those stored are of another version
+    :rtype: CountyMatrix
+    """
+    matrix_path = snapshot.snapshot_path / 'matrix'
+    try:
+        with open(matrix_path / 'matrix.json') as fp:
+            meta = json.load(fp)
+        if meta['data_version'] != data_version:
+            return None
+        matrices = {column: np.load(matrix_path / f'{column}.npy',
+                                    mmap_mode='r') for column in columns}
+        with open(matrix_path / 'matrix.json') as fp:
+            if json.load(fp) != meta:
+                return None
+        return CountyMatrix(meta['start'], np.asarray(meta['fips']),
+                            meta['labels'], matrices)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_matrix(data_version: str, built: dict) -> None:
+    """
+    A function for storing the matrices of a version of the county data
+    alongside the snapshots. The metadata is removed before the matrix
+    files are replaced and written after, so readers that find it unchanged
+    have read the matching files.
+    :param data_version: the version of the data
+    :type data_version: str
+    :param built: the matrices returned by build_matrix
+    :type built: dict
+    """
+    matrix_path = snapshot.snapshot_path / 'matrix'
+    matrix_path.mkdir(parents=True, exist_ok=True)
+    try:
+        os.remove(matrix_path / 'matrix.json')
+    except FileNotFoundError:
+        pass
+    for column in columns:
+        temporary = matrix_path / f'{column}.{os.getpid()}.tmp.npy'
+        np.save(temporary, built['matrices'][column])
+        os.replace(temporary, matrix_path / f'{column}.npy')
+    temporary = matrix_path / f'matrix.json.{os.getpid()}.tmp'
+    with open(temporary, 'w') as fp:
+        json.dump({'data_version': data_version,
+                   'start': str(built['start']),
+                   'fips': built['fips'].tolist(),
+                   'labels': built['labels']}, fp)
+    os.replace(temporary, matrix_path / 'matrix.json')
+
+
+def load_matrix(data_version: str, get_index) -> CountyMatrix:
+    """
+    A function for obtaining the dense matrices of a version of the county
+    data. If the COVID_MATRIX_MMAP environment variable is set to 1, the
+    matrices are stored alongside the snapshots and memory mapped, so that
+    other processes serving the same data map the same files instead of
+    building them.
+    :param data_version: the version of the data
+    :type data_version: str
+    :param get_index: a function returning the county region index, called
+    only if the matrices have to be built
+    :type get_index: callable
+    :return: the county matrices
+    :rtype: CountyMatrix
+    """
+    if stored:
+        matrix = read_matrix(data_version)
+        if matrix is not None:
+            return matrix
+    built = build_matrix(get_index())
+    if stored:
+        try:
+            write_matrix(data_version, built)
+        except OSError:
+            pass
+        matrix = read_matrix(data_version)
+        if matrix is not None:
+            return matrix
+    return CountyMatrix(built['start'], built['fips'], built['labels'],
+                        built['matrices'])
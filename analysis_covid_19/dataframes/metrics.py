@@ -0,0 +1,288 @@
+from analysis_covid_19.dataframes.region_index import RegionIndex
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+columns = ['cases', 'deaths']
+
+
+def daily_diff(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    A function for computing the day to day difference of cumulative counts
+    for many regions at once. The counts of each region must be contiguous
+    and in date order; the first day of each region has no difference.
+    :param values: the cumulative counts
+    :type values: np.ndarray
+    :param starts: the position at which each region begins
+    :type starts: np.ndarray
+    :return: the daily differences
+    :rtype: np.ndarray
+    """
+    values = values.astype('float64')
+    diff = np.empty_like(values)
+    diff[1:] = values[1:] - values[:-1]
+    diff[starts] = np.nan
+    return diff
+
+
+def rolling_mean(values: np.ndarray, dates: np.ndarray, regions: np.ndarray,
+                 days=7) -> np.ndarray:
+    """
+    A function for computing a rolling mean over a window of days for many
+    regions at once, equivalent to pandas' rolling(f'{days}d').mean() on each
+    region. Missing values are skipped and missing dates shorten the window.
+    Every window is computed from a single cumulative sum.
+    :param values: the values, contiguous by region and in date order
+    :type values: np.ndarray
+    :param dates: the date of each value
+    :type dates: np.ndarray
+    :param regions: the region number of each value, in ascending order
+    :type regions: np.ndarray
+    :param days: the number of days in the window
+    :type days: int
+    :return: the rolling means
+    :rtype: np.ndarray
+    """
+    day = dates.astype('datetime64[D]').astype('int64')
+    if len(day):
+        day = day - day.min()
+    span = int(day.max(initial=0)) + days + 1
+    key = regions.astype('int64') * span + day
+    start = np.searchsorted(key, key - days + 1)
+    valid = ~np.isnan(values)
+    sums = np.concatenate([[0.], np.cumsum(np.where(valid, values, 0.))])
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[1:] - sums[start]) / (counts[1:] - counts[start])
+
+
+def daily_metrics(dates: np.ndarray, counts: dict, starts: np.ndarray,
+                  regions: np.ndarray, dtype='float64') -> pd.DataFrame:
+    """
+    A function for computing daily new counts and their 7 day averages for
+    many regions at once.
+    :param dates: the dates, contiguous by region and in date order
+    :type dates: np.ndarray
+    :param counts: the cumulative cases and deaths for each date
+    :type counts: dict
+    :param starts: the position at which each region begins
+    :type starts: np.ndarray
+    :param regions: the region number of each date
+    :type regions: np.ndarray
+    :param dtype: the dtype used to store the results
+    :type dtype: str
+    :return: a dataframe of new_cases, new_cases_avg, new_deaths and
+    new_deaths_avg indexed by date
+    :rtype: pd.DataFrame
+    """
+    data = {}
+    for column in columns:
+        new = daily_diff(counts[column], starts)
+        data[f'new_{column}'] = new.astype(dtype)
+        data[f'new_{column}_avg'] = np.round(
+            rolling_mean(new, dates, regions)).astype(dtype)
+    return pd.DataFrame(data, index=pd.DatetimeIndex(dates, name='date'))
+
+
+class RegionMetrics:
+    """
+    A class that holds the daily new cases and deaths, and their 7 day
+    averages, for every region of a RegionIndex. They are computed in one
+    vectorized pass and stored in the index's region and date order, so the
+    metrics of a region are a slice of precomputed arrays.
+    """
+
+    def __init__(self, index: RegionIndex):
+        self.index = index
+        order = index.order
+        df = index.df
+        self.frame = daily_metrics(
+            df['date'].values[order],
+            {column: df[column].values[order] for column in columns},
+            index.starts, index.region_codes(), dtype='float32')
+
+    def lookup(self, *key) -> pd.DataFrame:
+        """
+        A method for obtaining the metrics of a region.
+        :param key: the state, or the state and county, of the region
+        :type key: str
+        :return: a pandas dataframe of the region's metrics indexed by date
+        :rtype: pd.DataFrame
+        """
+        start, stop = self.index.span(*key)
+        return self.frame.iloc[start:stop]
+
+
+class RollingEngine:
+    """
+    A class that computes rolling metrics of the daily new cases and deaths
+    of every region of a RegionMetrics: sums or means over a window of any
+    number of days, the growth of a window over the window before it, and
+    rates per 100,000 people. The cumulative sums of the daily counts are
+    taken once, so every window of every region is the difference of two
+    of their entries.
+    """
+
+    def __init__(self, metrics: RegionMetrics, populations=None,
+                 cache_size=32):
+        self.metrics = metrics
+        index = metrics.index
+        day = metrics.frame.index.values.astype('datetime64[D]').astype(
+            'int64')
+        if len(day):
+            day = day - day.min()
+        regions = index.region_codes()
+        self.key = regions * (int(day.max(initial=0)) + 1) + day
+        self.row_starts = np.repeat(index.starts, index.stops - index.starts)
+        self.sums = {}
+        self.counts = {}
+        for column in columns:
+            values = metrics.frame[f'new_{column}'].values.astype('float64')
+            valid = ~np.isnan(values)
+            self.sums[column] = np.concatenate(
+                [[0.], np.cumsum(np.where(valid, values, 0.))])
+            self.counts[column] = np.concatenate([[0], np.cumsum(valid)])
+        self.populations = None
+        if populations is not None:
+            self.populations = populations[regions]
+        self.bounds = lru_cache(maxsize=cache_size)(self._bounds)
+        self.values = lru_cache(maxsize=cache_size)(self._values)
+
+    def _bounds(self, days: int, lag=0) -> tuple:
+        """
+        A method for finding the rows within a window of days that ends lag
+        days before each row, and within the same region. It is called
+        through self.bounds, which caches the windows recently used.
+        :param days: the number of days in the window
+        :type days: int
+        :param lag: the number of days between each row and its window
+        :type lag: int
+        :return: the positions at which each window starts and stops
+        :rtype: tuple
+        """
+        stop = np.searchsorted(self.key, self.key - lag, side='right')
+        start = np.searchsorted(self.key, self.key - lag - days, side='right')
+        start = np.maximum(start, self.row_starts)
+        return start, np.maximum(stop, start)
+
+    def _window(self, column: str, days: int, lag=0) -> tuple:
+        start, stop = self.bounds(days, lag)
+        return (self.sums[column][stop] - self.sums[column][start],
+                self.counts[column][stop] - self.counts[column][start])
+
+    def _values(self, column='cases', days=7, how='mean', per_100k=False,
+                growth=False) -> np.ndarray:
+        """
+        A method for computing a rolling metric for every row. It is called
+        through self.values, which caches the metrics recently used.
+        :param column: 'cases' or 'deaths'
+        :type column: str
+        :param days: the number of days in the window
+        :type days: int
+        :param how: 'mean' for the mean of the daily counts in the window or
+        'sum' for their total
+        :type how: str
+        :param per_100k: whether to divide by the population of the region
+        and multiply by 100,000
+        :type per_100k: bool
+        :param growth: whether to compute the percent change of the window's
+        total from the window before it instead
+        :type growth: bool
+        :return: the metric of every row, NaN where it cannot be computed
+        :rtype: np.ndarray
+        """
+        sums, counts = self._window(column, days)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if growth:
+                previous, previous_counts = self._window(column, days, days)
+                values = np.where((counts > 0) & (previous_counts > 0) &
+                                  (previous > 0),
+                                  (sums / previous - 1) * 100, np.nan)
+            elif how == 'sum':
+                values = np.where(counts > 0, sums, np.nan)
+            elif how == 'mean':
+                values = sums / counts
+            else:
+                raise ValueError(f"how must be 'mean' or 'sum', not {how!r}")
+            if per_100k and not growth:
+                if self.populations is None or \
+                        np.isnan(self.populations).all():
+                    raise ValueError('the populations of the regions are not '
+                                     'known')
+                values = values / self.populations * 100000
+        return values
+
+    def lookup(self, *key, **metric) -> pd.Series:
+        """
+        A method for obtaining a rolling metric of a region.
+        :param key: the state, or the state and county, of the region
+        :type key: str
+        :param metric: the column, days, how, per_100k and growth arguments
+        of the metric, see _values
+        :return: a pandas series of the metric indexed by date
+        :rtype: pd.Series
+        """
+        start, stop = self.metrics.index.span(*key)
+        return pd.Series(self.values(**metric)[start:stop],
+                         index=self.metrics.frame.index[start:stop])
+
+
+class NationalMetrics:
+    """
+    A class that computes the daily new cases and deaths for the US, and
+    their 7 day averages, excluding any set of states. The cumulative counts
+    of every state are held as a date by state matrix along with their
+    total, so the US counts without a set of states are the total less the
+    columns of those states rather than a new groupby of the dataframe.
+    """
+
+    def __init__(self, index: RegionIndex, cache_size=64):
+        df = index.df
+        order = index.order
+        self.dates, day = np.unique(df['date'].values[order],
+                                    return_inverse=True)
+        region = index.region_codes()
+        self.positions = {state: position for position, state in
+                          enumerate(index.regions())}
+        shape = (len(self.dates), len(self.positions))
+        self.present = np.zeros(shape, dtype='int64')
+        np.add.at(self.present, (day, region), 1)
+        self.totals = {}
+        self.matrices = {}
+        for column in columns:
+            matrix = np.zeros(shape)
+            values = df[column].values[order].astype('float64')
+            np.add.at(matrix, (day, region), np.nan_to_num(values))
+            self.matrices[column] = matrix
+            self.totals[column] = matrix.sum(axis=1)
+        self.reporting = self.present.sum(axis=1)
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, excluded=frozenset()) -> pd.DataFrame:
+        """
+        A method for obtaining the US metrics from March 2020 onwards,
+        excluding a set of states. It is called through self.lookup, which
+        caches recent lookups; the dataframe returned is shared and must not
+        be modified.
+        :param excluded: the states to exclude
+        :type excluded: frozenset
+        :return: a dataframe of new_cases, new_cases_avg, new_deaths and
+        new_deaths_avg indexed by date
+        :rtype: pd.DataFrame
+        """
+        excluded = [self.positions[state] for state in excluded
+                    if state in self.positions]
+        reported = self.reporting - self.present[:, excluded].sum(axis=1) > 0
+        dates = self.dates[reported]
+        keep = np.searchsorted(dates, np.datetime64('2020-02-29'),
+                               side='right')
+        data = {}
+        for column in columns:
+            totals = (self.totals[column] -
+                      self.matrices[column][:, excluded].sum(axis=1))
+            new = daily_diff(totals[reported], np.array([0]))[keep:]
+            data[f'new_{column}'] = new
+            data[f'new_{column}_avg'] = np.round(rolling_mean(
+                new, dates[keep:], np.zeros(len(new), dtype='int64')))
+        return pd.DataFrame(data, index=pd.DatetimeIndex(dates[keep:],
+                                                         name='date'))
@@ -0,0 +1,64 @@
+from analysis_covid_19.dataframes.region_index import RegionIndex
+from pathlib import Path
+import json
+import numpy as np
+import os
+import pandas as pd
+
+population_path = Path(
+    __file__).parent.parent.parent / 'state_populations' / 'populations.json'
+
+county_population_path = Path(
+    __file__).parent.parent.parent / 'county_populations' / 'populations.json'
+
+county_population_source = os.environ.get('COVID_COUNTY_POPULATION')
+
+
+def get_state_populations() -> dict:
+    """
+    A function for generating a dict of the 2019 census population estimate
+    of each US state and territory, keyed by state FIPS code, from a json
+    file.
+    :return: a dict of FIPS codes and their respective populations
+    :rtype: dict
+    """
+    with open(population_path) as fp:
+        return {int(fips): entry['population']
+                for fips, entry in json.load(fp).items()}
+
+
+def get_county_populations() -> dict:
+    """
+    A function for generating a dict of the 2019 census population estimate
+    of each US county, keyed by county FIPS code, from a json file. The
+    populations can be replaced by those of a csv file with fips and
+    population columns, named by the COVID_COUNTY_POPULATION environment
+    variable.
+    :return: a dict of FIPS codes and their respective populations
+    :rtype: dict
+    """
+    if not county_population_source:
+        with open(county_population_path) as fp:
+            return {int(fips): entry['population']
+                    for fips, entry in json.load(fp).items()}
+    df = pd.read_csv(county_population_source, usecols=['fips', 'population'])
+    df = df.dropna()
+    return dict(zip(df['fips'].astype('int64'), df['population']))
+
+
+def region_populations(index: RegionIndex, populations: dict) -> np.ndarray:
+    """
+    A function for looking up the population of every region of an index by
+    the FIPS code in its fips column.
+    :param index: a region index
+    :type index: RegionIndex
+    :param populations: a dict of FIPS codes and their populations
+    :type populations: dict
+    :return: the population of each region, NaN where it is not known
+    :rtype: np.ndarray
+    """
+    fips = np.asarray(index.df['fips'].values[index.order[index.starts]],
+                      dtype='float64')
+    return np.array([np.nan if np.isnan(code) else
+                     populations.get(int(code), np.nan) for code in fips],
+                    dtype='float64')
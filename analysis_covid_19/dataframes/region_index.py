@@ -0,0 +1,84 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+
+class RegionIndex:
+    """
+    A class that indexes a covid-19 dataframe by region (a state, or a state
+    and county). The row positions of the dataframe are sorted once by
+    region and date, so the rows of any one region form a contiguous range
+    of that ordering and can be looked up without scanning the dataframe.
+    """
+
+    def __init__(self, df: pd.DataFrame, keys: list, cache_size=64):
+        self.df = df
+        self.keys = keys
+        codes = [pd.factorize(df[key], sort=True)[0] for key in keys]
+        self.order = np.lexsort([df['date'].values] + codes[::-1])
+        change = np.zeros(len(df), dtype=bool)
+        change[:1] = True
+        for code in codes:
+            sorted_code = code[self.order]
+            change[1:] |= sorted_code[1:] != sorted_code[:-1]
+        self.starts = np.flatnonzero(change)
+        self.stops = np.append(self.starts[1:], len(df))
+        first_rows = self.order[self.starts]
+        labels = zip(*[df[key].values[first_rows] for key in keys])
+        self.offsets = {
+            label if len(keys) > 1 else label[0]: (start, stop)
+            for label, start, stop in zip(labels, self.starts, self.stops)}
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def span(self, *key) -> tuple:
+        """
+        A method for obtaining the range of a region within the sorted
+        ordering of the dataframe.
+        :param key: the state, or the state and county, of the region
+        :type key: str
+        :return: the start and stop of the range
+        :rtype: tuple
+        """
+        return self.offsets.get(key if len(key) > 1 else key[0], (0, 0))
+
+    def rows(self, *key) -> np.ndarray:
+        """
+        A method for obtaining the row positions of a region in the
+        dataframe, in date order.
+        :param key: the state, or the state and county, of the region
+        :type key: str
+        :return: an array of row positions
+        :rtype: np.ndarray
+        """
+        start, stop = self.span(*key)
+        return self.order[start:stop]
+
+    def region_codes(self) -> np.ndarray:
+        """
+        A method for obtaining the number of the region each row belongs to,
+        in the sorted ordering of the dataframe.
+        :return: an array of region numbers
+        :rtype: np.ndarray
+        """
+        return np.repeat(np.arange(len(self.starts)), self.stops - self.starts)
+
+    def _lookup(self, *key) -> pd.DataFrame:
+        """
+        A method for obtaining the rows of a region as a dataframe indexed by
+        date. It is called through self.lookup, which caches recent lookups
+        so that the case and death plots of a region share one lookup. The
+        dataframe returned is shared and must not be modified.
+        :param key: the state, or the state and county, of the region
+        :type key: str
+        :return: a pandas dataframe of the region's covid-19 data
+        :rtype: pd.DataFrame
+        """
+        return self.df.take(self.rows(*key)).set_index('date')
+
+    def regions(self) -> list:
+        """
+        A method for obtaining the regions in the index.
+        :return: a list of regions
+        :rtype: list
+        """
+        return list(self.offsets)
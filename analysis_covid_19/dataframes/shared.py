@@ -0,0 +1,76 @@
+from analysis_covid_19.dataframes import snapshot
+import argparse
+import os
+import time
+import pandas as pd
+
+enabled = os.environ.get('COVID_SHARED_DATA', '0') == '1'
+
+attach_attempts = 10
+
+
+def attach(name: str) -> pd.DataFrame:
+    """
+    A function for attaching to a snapshot written by the loader process.
+    The dataframe returned is a read-only view of the memory mapped column
+    files, so every process attached to the same snapshot shares one copy
+    of the data in the page cache. Nothing is fetched or written.
+    :param name: the name of the snapshot
+    :type name: str
+    :return: the dataset as a pandas dataframe
+    :rtype: pd.DataFrame
+    """
+    for attempt in range(attach_attempts):
+        meta = snapshot.read_meta(name)
+        if meta is not None:
+            try:
+                df = snapshot.read_snapshot(name, meta, zero_copy=True)
+            except (OSError, ValueError):
+                df = None
+            # the metadata is removed before a snapshot's files are replaced
+            # and written after, so if it is unchanged the files matched it
+            if df is not None and snapshot.read_meta(name) == meta:
+                return df
+        time.sleep(0.1 * (attempt + 1))
+    raise FileNotFoundError(
+        f'no snapshot of {name} in {snapshot.snapshot_path}; run '
+        f'python -m analysis_covid_19.dataframes.shared to write it')
+
+
+def materialize() -> None:
+    """
+    A function for bringing the snapshots and the directory of the county
+    data up to date, and the county matrices if COVID_MATRIX_MMAP is set to
+    1, so that app processes can attach to them.
+    """
+    from analysis_covid_19.dataframes import matrix
+    from analysis_covid_19.dataframes.dataset import Dataset
+    dataset = Dataset()
+    dataset.directory
+    if matrix.stored:
+        dataset.county_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write the covid-19 datasets to memory mapped snapshots '
+                    'that app processes run with COVID_SHARED_DATA=1 attach '
+                    'to, and keep them up to date.')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='the seconds between refreshes; by default '
+                             'the snapshots are refreshed once')
+    args = parser.parse_args()
+    # this process writes the snapshots, so it must not attach to them
+    from analysis_covid_19.dataframes import shared
+    shared.enabled = False
+    while True:
+        start = time.perf_counter()
+        materialize()
+        print(f'snapshots refreshed in {time.perf_counter() - start:.1f}s')
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
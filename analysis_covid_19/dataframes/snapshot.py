@@ -0,0 +1,496 @@
+from analysis_covid_19.dataframes import fetch
+from pathlib import Path
+import hashlib
+import io
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import requests
+
+snapshot_path = Path(os.environ.get(
+    'COVID_SNAPSHOT_DIR', Path(__file__).parent.parent.parent / 'snapshots'))
+
+max_age = float(os.environ.get('COVID_SNAPSHOT_MAX_AGE', 0))
+
+
+def is_url(source: str) -> bool:
+    """
+    A function for determining whether a dataset source is a url or a path to
+    a file on local disk.
+    :param source: a url or a local file path
+    :type source: str
+    :return: True if the source is an http(s) url
+    :rtype: bool
+    """
+    return str(source).startswith(('http://', 'https://'))
+
+
+def hash_file(fp, size=None) -> str:
+    """
+    A function for computing the sha256 of the start of a file in chunks,
+    without reading the whole file into memory. The file is left positioned
+    at its start.
+    :param fp: a binary file object
+    :type fp: io.BufferedIOBase
+    :param size: the number of bytes to hash, by default the whole file
+    :type size: int
+    :return: the sha256 of the bytes
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    fp.seek(0)
+    remaining = size
+    while remaining is None or remaining > 0:
+        chunk = fp.read(fetch.chunk_size if remaining is None else
+                        min(fetch.chunk_size, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+    fp.seek(0)
+    return digest.hexdigest()
+
+
+def open_source(source: str, validators: dict) -> tuple:
+    """
+    A function for opening a dataset only if it has changed since it was
+    last fetched. Urls are requested conditionally with the ETag and
+    Last-Modified validators of the previous response and their body is
+    spooled to a temporary file; local files are compared by modification
+    time and size and opened as they are.
+    :param source: a url or a local file path
+    :type source: str
+    :param validators: the validators recorded by the previous fetch
+    :type validators: dict
+    :return: a binary file object positioned at its start (None if
+    unchanged) and the new validators
+    :rtype: tuple
+    """
+    if is_url(source):
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        response, body, digest = fetch.get(source, headers)
+        if response.status_code == 304:
+            body.close()
+            return None, validators
+        if not response.ok:
+            body.close()
+            response.raise_for_status()
+        return body, {'etag': response.headers.get('ETag'),
+                      'last_modified': response.headers.get(
+                          'Last-Modified'),
+                      'sha256': digest}
+    stat = os.stat(source)
+    if (validators.get('mtime') == stat.st_mtime and
+            validators.get('size') == stat.st_size):
+        return None, validators
+    body = open(source, 'rb')
+    return body, {'mtime': stat.st_mtime, 'size': stat.st_size,
+                  'sha256': hash_file(body)}
+
+
+def fetch_source(source: str, validators: dict) -> tuple:
+    """
+    A function for opening a dataset only if its content has changed since
+    it was last fetched; see open_source. The sha256 of the content is
+    compared as a last resort. The file object returned is read in chunks
+    by the parser rather than loaded into memory, and must be closed by the
+    caller.
+    :param source: a url or a local file path
+    :type source: str
+    :param validators: the validators recorded by the previous fetch
+    :type validators: dict
+    :return: a binary file object (None if unchanged) and the new validators
+    :rtype: tuple
+    """
+    body, new_validators = open_source(source, validators)
+    if body is not None and new_validators['sha256'] == validators.get(
+            'sha256'):
+        body.close()
+        return None, new_validators
+    return body, new_validators
+
+
+def fetch_tail(source: str, meta: dict) -> tuple:
+    """
+    A function for fetching only the bytes that have been added to the end
+    of a csv file since a snapshot of it was written. The file is opened
+    conditionally, as by fetch_source, and the whole previously ingested
+    prefix is checked against its sha256 before the bytes that follow it
+    are returned, so a revision of any earlier row is detected even if it
+    leaves the length of the file unchanged.
+    :param source: a url or a local file path
+    :type source: str
+    :param meta: the snapshot metadata
+    :type meta: dict
+    :return: the new bytes (None if unchanged) and the new validators
+    :rtype: tuple
+    :raises ValueError: if the rows already ingested have been revised
+    """
+    tail = meta['tail']
+    body, validators = open_source(source, meta['validators'])
+    if body is None:
+        return None, validators
+    with body:
+        if body.seek(0, io.SEEK_END) < tail['size']:
+            raise ValueError(f'{source} is smaller than the snapshot')
+        if hash_file(body, tail['size']) != meta['validators'].get('sha256'):
+            raise ValueError(f'{source} has been revised')
+        body.seek(tail['size'])
+        return body.read(), validators
+
+
+def read_meta(name: str) -> dict:
+    """
+    A function for reading the metadata of a snapshot.
+    :param name: the name of the snapshot
+    :type name: str
+    :return: the snapshot metadata, or None if there is no snapshot
+    :rtype: dict
+    """
+    try:
+        with open(snapshot_path / name / 'meta.json') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_version(*names) -> str:
+    """
+    A function for identifying the data held in one or more snapshots. The
+    version changes whenever any of the snapshots is rewritten or appended
+    to, and is the same in every process that reads the same snapshots.
+    :param names: the names of the snapshots
+    :type names: str
+    :return: a short hexadecimal version string
+    :rtype: str
+    """
+    metas = [read_meta(name) for name in names]
+    identity = [[meta['rows'], meta['validators']] if meta else None
+                for meta in metas]
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode(
+    )).hexdigest()[:16]
+
+
+def write_meta(name: str, meta: dict) -> None:
+    """
+    A function for atomically replacing the metadata of a snapshot.
+    :param name: the name of the snapshot
+    :type name: str
+    :param meta: the snapshot metadata
+    :type meta: dict
+    """
+    path = snapshot_path / name / 'meta.json'
+    with open(path.with_suffix('.tmp'), 'w') as fp:
+        json.dump(meta, fp)
+    os.replace(path.with_suffix('.tmp'), path)
+
+
+def encode_column(series: pd.Series, spec: dict = None) -> tuple:
+    """
+    A function for converting a column of a dataframe to the raw values that
+    are stored on disk. When the spec of an existing snapshot column is given,
+    the values are encoded to match it and any new string values are added
+    to the end of its categories so that existing codes remain valid.
+    :param series: the column to encode
+    :type series: pd.Series
+    :param spec: the spec of an existing snapshot column
+    :type spec: dict
+    :return: the values to store and the spec of the column
+    :rtype: tuple
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.values.astype('datetime64[ns]').view('int64')
+        return values, {'name': series.name, 'kind': 'datetime',
+                        'dtype': 'int64'}
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy()
+        if spec is not None:
+            dtype = np.dtype(spec['dtype'])
+            if dtype.kind in 'iu' and np.isnan(values.astype(float)).any():
+                raise ValueError(f'{series.name} can no longer be stored as '
+                                 f'{dtype}')
+            values = values.astype(dtype)
+        return values, {'name': series.name, 'kind': 'numeric',
+                        'dtype': values.dtype.str}
+    categories = list(spec['categories']) if spec is not None else sorted(
+        series.dropna().unique())
+    new_categories = set(series.dropna().unique()).difference(categories)
+    categories.extend(sorted(new_categories))
+    dtype = spec['dtype'] if spec is not None else code_dtype(categories)
+    if len(categories) >= np.iinfo(dtype).max:
+        raise ValueError(f'the categories of {series.name} no longer fit '
+                         f'in {dtype} codes')
+    codes = pd.Categorical(series, categories=categories).codes
+    return codes.astype(dtype), {'name': series.name, 'kind': 'category',
+                                 'dtype': dtype, 'categories': categories}
+
+
+def code_dtype(categories: list) -> str:
+    """
+    A function for choosing the dtype used to store the codes of a string
+    column: the smallest integer dtype that pandas would itself use for the
+    codes of a categorical with these categories, so that the stored codes
+    can back a categorical without being copied.
+    :param categories: the categories of the column
+    :type categories: list
+    :return: the dtype of the codes
+    :rtype: str
+    """
+    for dtype in ('int8', 'int16', 'int32'):
+        if len(categories) < np.iinfo(dtype).max:
+            return dtype
+    return 'int64'
+
+
+def tail_info(buffer, df: pd.DataFrame) -> dict:
+    """
+    A function for recording the size and header of a date-sorted csv file
+    and the latest date in it. This allows a later refresh to confirm the
+    rows already ingested are unchanged, by the sha256 of the first size
+    bytes of the file, and to parse only the rows that follow them.
+    :param buffer: a binary file object containing the csv file
+    :type buffer: io.BufferedIOBase
+    :param df: the dataframe parsed from the csv file
+    :type df: pd.DataFrame
+    :return: the size, header and latest date of the csv file
+    :rtype: dict
+    """
+    buffer.seek(0)
+    header = buffer.readline()
+    return {'size': buffer.seek(0, io.SEEK_END), 'header': header.decode(),
+            'last_date': df['date'].max().strftime('%Y-%m-%d')}
+
+
+def write_snapshot(name: str, df: pd.DataFrame, validators: dict,
+                   tail: dict = None) -> dict:
+    """
+    A function for writing a dataframe to disk as one raw binary file per
+    column. String columns are stored as integer codes with their categories
+    recorded in the metadata, dates are stored as int64 nanoseconds.
+    :param name: the name of the snapshot
+    :type name: str
+    :param df: the dataframe to store
+    :type df: pd.DataFrame
+    :param validators: the validators of the source the dataframe came from
+    :type validators: dict
+    :param tail: the size, header and latest date of the source, see
+    tail_info
+    :type tail: dict
+    :return: the snapshot metadata
+    :rtype: dict
+    """
+    directory = snapshot_path / name
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        os.remove(directory / 'meta.json')
+    except FileNotFoundError:
+        pass
+    columns = []
+    for column in df.columns:
+        values, spec = encode_column(df[column])
+        # each file is replaced rather than overwritten, so that processes
+        # with the previous file memory mapped keep reading it unchanged
+        path = directory / f'{column}.bin'
+        temporary = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        np.ascontiguousarray(values).tofile(temporary)
+        os.replace(temporary, path)
+        columns.append(spec)
+    meta = {'rows': len(df), 'columns': columns, 'validators': validators,
+            'checked': time.time(), 'tail': tail}
+    write_meta(name, meta)
+    return meta
+
+
+def append_snapshot(name: str, df: pd.DataFrame, meta: dict, **fields) -> dict:
+    """
+    A function for appending rows to the column files of an existing
+    snapshot. The metadata is only replaced once every column has been
+    written, so readers never see a partially appended snapshot.
+    :param name: the name of the snapshot
+    :type name: str
+    :param df: the rows to append
+    :type df: pd.DataFrame
+    :param meta: the snapshot metadata
+    :type meta: dict
+    :param fields: other metadata fields to replace
+    :type fields: dict
+    :return: the updated snapshot metadata
+    :rtype: dict
+    """
+    encoded = [encode_column(df[spec['name']], spec)
+               for spec in meta['columns']]
+    for values, spec in encoded:
+        path = snapshot_path / name / f"{spec['name']}.bin"
+        with open(path, 'r+b') as fp:
+            fp.seek(meta['rows'] * np.dtype(spec['dtype']).itemsize)
+            fp.truncate()
+            np.ascontiguousarray(values).tofile(fp)
+    meta = dict(meta, rows=meta['rows'] + len(df),
+                columns=[spec for _, spec in encoded], **fields)
+    write_meta(name, meta)
+    return meta
+
+
+def read_snapshot(name: str, meta: dict, categorical=False,
+                  zero_copy=False) -> pd.DataFrame:
+    """
+    A function for loading a snapshot from disk. Each column file is memory
+    mapped rather than parsed.
+    :param name: the name of the snapshot
+    :type name: str
+    :param meta: the snapshot metadata
+    :type meta: dict
+    :param categorical: if True, string columns are returned as categoricals
+    rather than object arrays
+    :type categorical: bool
+    :param zero_copy: if True, the columns of the dataframe are read-only
+    views of the memory mapped files rather than copies, and string columns
+    are returned as categoricals
+    :type zero_copy: bool
+    :return: the stored dataframe
+    :rtype: pd.DataFrame
+    """
+    data = {}
+    for spec in meta['columns']:
+        values = np.memmap(snapshot_path / name / f"{spec['name']}.bin",
+                           dtype=spec['dtype'], mode='r',
+                           shape=(meta['rows'],))
+        if spec['kind'] == 'datetime':
+            values = values.view('datetime64[ns]')
+        elif spec['kind'] == 'category' and (categorical or zero_copy):
+            values = pd.Categorical.from_codes(values, spec['categories'])
+        elif spec['kind'] == 'category':
+            categories = np.array(spec['categories'] + [np.nan], dtype=object)
+            values = categories.take(values)
+        data[spec['name']] = values
+    if zero_copy:
+        return frame_from_columns(data, meta['rows'])
+    return pd.DataFrame(data)
+
+
+def frame_from_columns(data: dict, rows: int) -> pd.DataFrame:
+    """
+    A function for building a dataframe backed by the given column arrays
+    rather than copies of them, so that memory mapped columns stay shared.
+    Since pandas 1.3 a dict passed to pd.DataFrame with copy=False keeps
+    each column in a block of its own instead of consolidating columns of
+    the same dtype into a copy.
+    :param data: the values of each column
+    :type data: dict
+    :param rows: the number of rows
+    :type rows: int
+    :return: a dataframe backed by the given values
+    :rtype: pd.DataFrame
+    """
+    return pd.DataFrame(data, index=pd.RangeIndex(rows), copy=False)
+
+
+def refresh_snapshot(name: str, source: str, parser, meta: dict) -> tuple:
+    """
+    A function for appending the rows that have been added to the end of a
+    date-sorted csv file to its snapshot, without downloading or parsing the
+    rows that were already ingested. Only rows dated after the latest date in
+    the snapshot may be appended.
+    :param name: the name of the snapshot
+    :type name: str
+    :param source: the url or local file path of the csv file
+    :type source: str
+    :param parser: a function that builds the dataframe from a csv buffer
+    :type parser: callable
+    :param meta: the snapshot metadata
+    :type meta: dict
+    :return: the updated snapshot metadata and the appended rows, or None if
+    the snapshot must be rebuilt from the full csv file
+    :rtype: tuple
+    """
+    try:
+        payload, validators = fetch_tail(source, meta)
+    except ValueError:
+        return None
+    tail = meta['tail']
+    if not payload or not payload.strip():
+        meta = dict(meta, validators=validators, checked=time.time())
+        write_meta(name, meta)
+        return meta, None
+    header = tail['header'].encode()
+    buffer = io.BytesIO(header + payload)
+    df = parser(buffer)
+    if list(df.columns) != [spec['name'] for spec in meta['columns']]:
+        return None
+    if df['date'].min() <= pd.Timestamp(tail['last_date']):
+        return None
+    new_tail = tail_info(buffer, df)
+    new_tail['size'] += tail['size'] - len(header)
+    try:
+        meta = append_snapshot(name, df, meta, validators=validators,
+                               tail=new_tail, checked=time.time())
+    except ValueError:
+        return None
+    return meta, df
+
+
+def load_snapshot(name: str, source: str, parser, incremental=False,
+                  df=None, categorical=False) -> pd.DataFrame:
+    """
+    A function for loading a dataset through its on-disk snapshot. The source
+    is only downloaded and parsed again when it has changed since the
+    snapshot was written; otherwise the snapshot is memory mapped from disk.
+    If the source cannot be reached, a stale snapshot is served instead.
+    :param name: the name of the snapshot
+    :type name: str
+    :param source: the url or local file path of the csv file
+    :type source: str
+    :param parser: a function that builds the dataframe from a csv buffer
+    :type parser: callable
+    :param incremental: if True, only rows added to the end of a date-sorted
+    source are fetched and appended, unless its history has been revised
+    :type incremental: bool
+    :param df: a dataframe previously loaded from the snapshot, which new
+    rows are appended to in place of reloading the snapshot
+    :type df: pd.DataFrame
+    :param categorical: if True, string columns loaded from the snapshot are
+    returned as categoricals rather than object arrays
+    :type categorical: bool
+    :return: the dataset as a pandas dataframe
+    :rtype: pd.DataFrame
+    """
+    meta = read_meta(name)
+    if meta is not None and time.time() - meta['checked'] < max_age:
+        return read_snapshot(name, meta, categorical)
+    if incremental and meta is not None and meta.get('tail'):
+        try:
+            refreshed = refresh_snapshot(name, source, parser, meta)
+        except (requests.RequestException, OSError):
+            refreshed = meta, None
+        if refreshed is not None:
+            meta, rows = refreshed
+            if df is None or len(df) + (
+                    len(rows) if rows is not None else 0) != meta['rows']:
+                return read_snapshot(name, meta, categorical)
+            if rows is None:
+                return df
+            return pd.concat([df, rows], ignore_index=True)
+    validators = meta['validators'] if meta is not None else {}
+    try:
+        body, validators = fetch_source(source, validators)
+    except (requests.RequestException, OSError):
+        if meta is None:
+            raise
+        return read_snapshot(name, meta, categorical)
+    if body is None:
+        meta['validators'] = validators
+        meta['checked'] = time.time()
+        write_meta(name, meta)
+        return read_snapshot(name, meta, categorical)
+    with body:
+        df = parser(body)
+        tail = tail_info(body, df) if incremental else None
+    write_snapshot(name, df, validators, tail)
+    return df
@@ -1,18 +1,49 @@
+from analysis_covid_19.dataframes import shared
+from analysis_covid_19.dataframes.snapshot import load_snapshot
+from analysis_covid_19.instrumentation import timed
 import pandas as pd
+import os
 
 url = 'https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-states.csv'
 
+source = os.environ.get('COVID_STATE_SOURCE', url)
 
-def get_state_dataframe() -> pd.DataFrame:
+from_counties = os.environ.get('COVID_DERIVE_STATES', '0') == '1'
+
+
+def parse_state_data(buffer) -> pd.DataFrame:
     """
-    A function for generating a pandas dataframe from the New York Time's
-    online csv file of covid-19 data for US states.
+    A function for parsing the New York Time's csv file of covid-19 data for
+    US states.
+    :param buffer: a file-like object containing the csv file
+    :type buffer: io.BytesIO
     :return: a pandas dataframe of US state covid-19 data
     :rtype: pd.DataFrame
     """
-    df = pd.read_csv(url, parse_dates=['date'])
+    df = pd.read_csv(buffer, parse_dates=['date'])
     df['death_rate'] = df['deaths'] / df['cases'] * 100
     return df
 
 
-state_df = get_state_dataframe()
+@timed()
+def get_state_dataframe() -> pd.DataFrame:
+    """
+    A function for generating a pandas dataframe from the New York Time's
+    online csv file of covid-19 data for US states. The csv file is only
+    downloaded and parsed when it has changed since the last snapshot of it
+    was written to disk. If the COVID_SHARED_DATA environment variable is set
+    to 1, the snapshot written by the loader process is attached to instead.
+    :return: a pandas dataframe of US state covid-19 data
+    :rtype: pd.DataFrame
+    """
+    if shared.enabled:
+        return shared.attach('us-states')
+    return load_snapshot('us-states', source, parse_state_data)
+
+
+def __getattr__(name):
+    # state_df is loaded lazily by the dataset module
+    if name == 'state_df':
+        from analysis_covid_19.dataframes.dataset import get_state_df
+        return get_state_df()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
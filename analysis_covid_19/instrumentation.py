@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+debug_panel = os.environ.get('COVID_DEBUG_PANEL', '0') == '1'
+enabled = os.environ.get('COVID_TIMINGS', '0') == '1' or debug_panel
+
+logger = logging.getLogger(__name__)
+if enabled and not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+latest = {}
+_local = threading.local()
+
+
+def record(name: str, seconds: float, **fields) -> dict:
+    """
+    A function for recording the time taken by a span. The span is logged as
+    a line of json, kept as the latest span of its name and added to the run
+    in progress on the current thread, if there is one.
+    :param name: the name of the span
+    :type name: str
+    :param seconds: the seconds taken
+    :type seconds: float
+    :param fields: further fields to log with the span
+    :return: the span
+    :rtype: dict
+    """
+    entry = dict(span=name, seconds=round(seconds, 6),
+                 thread=threading.current_thread().name, **fields)
+    latest[name] = entry
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans.append(entry)
+    logger.info(json.dumps(entry, default=str))
+    return entry
+
+
+@contextmanager
+def span(name: str, **fields):
+    """
+    A context manager for timing a block of code. Nothing is timed unless
+    the COVID_TIMINGS or COVID_DEBUG_PANEL environment variable is set to 1.
+    :param name: the name of the span
+    :type name: str
+    :param fields: further fields to log with the span
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, **fields)
+
+
+def timed(name=None):
+    """
+    A decorator for timing every call of a function. If timing is disabled
+    the function is returned unchanged, so there is no overhead.
+    :param name: the name of the span, by default the function's name
+    :type name: str
+    :return: the decorator
+    :rtype: callable
+    """
+
+    def decorator(function):
+        if not enabled:
+            return function
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def run(name: str):
+    """
+    A context manager for timing one run of the app. The spans recorded on
+    the current thread during the run can then be read with last_run.
+    :param name: the name of the span covering the run
+    :type name: str
+    """
+    if not enabled:
+        yield
+        return
+    _local.spans = []
+    with span(name):
+        yield
+
+
+def last_run() -> list:
+    """
+    A function for obtaining the spans recorded during the latest run of the
+    app on the current thread.
+    :return: a list of spans
+    :rtype: list
+    """
+    return list(getattr(_local, 'spans', None) or [])
@@ -1,14 +1,25 @@
-from analysis_covid_19.dataframes.state_dataframe import state_df
+from analysis_covid_19.dataframes.dataset import get_state_latest
 from datetime import datetime
 from dateutil import tz
 
 
 class PageData:
-    current_date = datetime.utcnow().replace(tzinfo=tz.gettz('UTC')).astimezone(
-        tz.gettz('America/Denver')).strftime('%B %d, %Y')
-    cases = state_df[state_df.date == state_df.date.max()].cases.sum()
-    deaths = state_df[state_df.date == state_df.date.max()].deaths.sum()
-    latest_data_date = state_df.date.max().strftime('%B %d, %Y')
+    @property
+    def current_date(self) -> str:
+        return datetime.utcnow().replace(tzinfo=tz.gettz('UTC')).astimezone(
+            tz.gettz('America/Denver')).strftime('%B %d, %Y')
+
+    @property
+    def cases(self) -> int:
+        return get_state_latest().totals()['cases']
+
+    @property
+    def deaths(self) -> int:
+        return get_state_latest().totals()['deaths']
+
+    @property
+    def latest_data_date(self) -> str:
+        return get_state_latest().latest_date.strftime('%B %d, %Y')
 
 
 page_data = PageData()
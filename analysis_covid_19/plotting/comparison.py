@@ -0,0 +1,110 @@
+from analysis_covid_19.dataframes.region_index import RegionIndex
+from analysis_covid_19.plotting import decimation
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def cap_points(dates: np.ndarray, values: np.ndarray, max_points=None) -> \
+        tuple:
+    """
+    A function for reducing a series to at most max_points points with the
+    largest triangle three buckets algorithm. If max_points is not given and
+    decimation is enabled, the series is reduced to the figure width.
+    Missing values, such as the first days of a 7 day average, are dropped
+    before the points are chosen.
+    :param dates: the dates of the series
+    :type dates: np.ndarray
+    :param values: the values of the series
+    :type values: np.ndarray
+    :param max_points: the largest number of points to keep, or None to keep
+    every point
+    :type max_points: int
+    :return: the dates and values that are kept
+    :rtype: tuple
+    """
+    if max_points is None and decimation.enabled:
+        max_points = decimation.figure_width
+    if max_points is None or len(values) <= max_points:
+        return dates, values
+    valid = ~np.isnan(values.astype('float64'))
+    dates, values = dates[valid], values[valid]
+    if len(values) <= max_points:
+        return dates, values
+    keep = decimation.lttb(dates.astype('datetime64[ns]').astype('int64'),
+                           values, max_points)
+    return dates[keep], values[keep]
+
+
+def region_series(index: RegionIndex, regions: list, column: str,
+                  max_points=None) -> list:
+    """
+    A function for obtaining the series of a column for many regions in one
+    pass: the rows of every region are gathered with a single take and then
+    split into one series per region.
+    :param index: the index of the dataframe
+    :type index: RegionIndex
+    :param regions: the regions of interest, each a state or a (state,
+    county) tuple
+    :type regions: list
+    :param column: the column of interest, e.g. 'cases'
+    :type column: str
+    :param max_points: the largest number of points in each series
+    :type max_points: int
+    :return: a list of the dates and values of each region
+    :rtype: list
+    """
+    spans = [index.span(*(region if isinstance(region, tuple) else
+                          (region,))) for region in regions]
+    rows = np.concatenate([index.order[start:stop] for start, stop in spans]
+                          + [np.array([], dtype='int64')])
+    dates = index.df['date'].values[rows]
+    values = index.df[column].values[rows]
+    bounds = np.cumsum([stop - start for start, stop in spans])[:-1]
+    return [cap_points(d, v, max_points) for d, v in
+            zip(np.split(dates, bounds), np.split(values, bounds))]
+
+
+def comparison_trace(name: str, dates: np.ndarray, values: np.ndarray,
+                     label: str) -> go.Scatter:
+    """
+    A function for building the line of one region in a comparison plot.
+    :param name: the name of the region
+    :type name: str
+    :param dates: the dates of the series
+    :type dates: np.ndarray
+    :param values: the values of the series
+    :type values: np.ndarray
+    :param label: the label of the values in the hover text, e.g. 'Cases'
+    :type label: str
+    :return: a plotly scatter trace
+    :rtype: go.Scatter
+    """
+    return go.Scatter(x=pd.DatetimeIndex(dates, name='date'), y=values,
+                      hovertemplate=f"{name}" +
+                                    "<br><b>Date: </b>%{x}" +
+                                    f"<br><b>{label}: </b>" + "%{y:,}" +
+                                    "<extra></extra>",
+                      marker={'opacity': 0.4}, name=name)
+
+
+def comparison_figure(names: list, series: list, label: str,
+                      layout: dict) -> go.Figure:
+    """
+    A function for building a plot with one line per region.
+    :param names: the name of each region
+    :type names: list
+    :param series: the dates and values of each region
+    :type series: list
+    :param label: the label of the values in the hover text, e.g. 'Cases'
+    :type label: str
+    :param layout: the layout of the figure
+    :type layout: dict
+    :return: a plotly figure object
+    :rtype: go.Figure
+    """
+    fig = go.Figure()
+    for name, (dates, values) in zip(names, series):
+        fig.add_trace(comparison_trace(name, dates, values, label))
+    fig.update_layout(**layout)
+    return fig
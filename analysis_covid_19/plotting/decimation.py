@@ -0,0 +1,113 @@
+import numpy as np
+import os
+import pandas as pd
+
+enabled = os.environ.get('COVID_DECIMATE', '0') == '1'
+figure_width = 900
+bar_width = 3
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    A function for choosing the points of a line to keep with the largest
+    triangle three buckets algorithm. The first and last points are kept and
+    the points in between are split into threshold - 2 buckets; from each
+    bucket the point forming the largest triangle with the point kept from
+    the previous bucket and the average of the next bucket is kept, which
+    preserves the peaks and troughs of the line.
+    :param x: the x values of the line, in ascending order
+    :type x: np.ndarray
+    :param y: the y values of the line
+    :type y: np.ndarray
+    :param threshold: the number of points to keep
+    :type threshold: int
+    :return: the positions of the points to keep
+    :rtype: np.ndarray
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n) if threshold >= n else np.array(
+            [0, n - 1][:max(threshold, 1)], dtype='int64')
+    x = x.astype('float64')
+    y = y.astype('float64')
+    bounds = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)
+              ).astype('int64') + 1
+    bounds[-1] = n - 1
+    keep = np.empty(threshold, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    for bucket in range(threshold - 2):
+        start, stop = bounds[bucket], bounds[bucket + 1]
+        following = slice(stop, bounds[bucket + 2] if bucket + 2 <
+                          len(bounds) else n)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        prev_x, prev_y = x[keep[bucket]], y[keep[bucket]]
+        area = np.abs((prev_x - next_x) * (y[start:stop] - prev_y) -
+                      (prev_x - x[start:stop]) * (next_y - prev_y))
+        keep[bucket + 1] = start + int(np.argmax(area))
+    return keep
+
+
+def decimate_line(series: pd.Series, max_points=None) -> pd.Series:
+    """
+    A function for reducing a date indexed line to at most one point per
+    pixel of the figure width.
+    :param series: the line
+    :type series: pd.Series
+    :param max_points: the largest number of points to keep, by default the
+    figure width
+    :type max_points: int
+    :return: the points kept
+    :rtype: pd.Series
+    """
+    max_points = max_points or figure_width
+    if len(series) <= max_points:
+        return series
+    series = series.dropna()
+    keep = lttb(series.index.values.astype('int64'), series.values,
+                max_points)
+    return series.iloc[keep]
+
+
+def decimate_bars(series: pd.Series, max_bars=None) -> pd.Series:
+    """
+    A function for reducing a date indexed series of daily bars to weekly
+    bars when there are too many days to draw bars bar_width pixels wide.
+    Each weekly bar is the average day of its week, so it stays on the scale
+    of the daily values, and is placed at the first day of its week.
+    :param series: the daily values
+    :type series: pd.Series
+    :param max_bars: the largest number of bars, by default the figure
+    width divided by bar_width
+    :type max_bars: int
+    :return: the daily or weekly values
+    :rtype: pd.Series
+    """
+    if len(series) <= (max_bars or figure_width // bar_width):
+        return series
+    day = series.index.values.astype('datetime64[D]').astype('int64')
+    week = (day - day[0]) // 7
+    valid = ~np.isnan(series.values)
+    totals = np.bincount(week, np.where(valid, series.values, 0.))
+    counts = np.bincount(week, valid)
+    firsts = np.flatnonzero(np.diff(week, prepend=-1))
+    with np.errstate(invalid='ignore'):
+        means = (totals / counts)[week[firsts]]
+    return pd.Series(np.round(means), index=series.index[firsts],
+                     name=series.name)
+
+
+def decimate_daily(data: pd.Series, moving_avg: pd.Series) -> tuple:
+    """
+    A function for decimating the daily bars and 7 day average line of a
+    daily figure if decimation is enabled by setting the COVID_DECIMATE
+    environment variable to 1.
+    :param data: the daily values
+    :type data: pd.Series
+    :param moving_avg: the 7 day averages
+    :type moving_avg: pd.Series
+    :return: the bars and line to plot
+    :rtype: tuple
+    """
+    if not enabled:
+        return data, moving_avg
+    return decimate_bars(data), decimate_line(moving_avg)
@@ -1,7 +1,25 @@
-from analysis_covid_19.dataframes.county_dataframe import county_df
+from analysis_covid_19.caching import memoize
+from analysis_covid_19.dataframes.dataset import (
+    get_counties, get_county_index, get_county_latest, get_county_matrix,
+    get_county_metrics)
+from analysis_covid_19.plotting.comparison import (
+    comparison_figure, region_series)
+from analysis_covid_19.plotting.decimation import decimate_daily, figure_width
+import numpy as np
+import os
 import plotly.graph_objects as go
 
+county_geojson = os.environ.get(
+    'COVID_COUNTY_GEOJSON', 'https://raw.githubusercontent.com/plotly/'
+                            'datasets/master/geojson-counties-fips.json')
 
+map_measures = {'cases': 'Cumulative Cases',
+                'deaths': 'Cumulative Deaths',
+                'new_cases': 'Daily New Cases (7 Day Average)',
+                'new_deaths': 'Daily New Deaths (7 Day Average)'}
+
+
+@memoize()
 def plot_top_n_county_cases(n=10, include_unknown=True) -> go.Figure:
     """
     A function that generates a plotly bar plot of the case counts of
@@ -14,26 +32,23 @@ def plot_top_n_county_cases(n=10, include_unknown=True) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    if include_unknown:
-        data = county_df.groupby('county').cases.max().sort_values(
-            ascending=False)[:n]
-    else:
-        data = county_df.loc[
-                   ~county_df['county'].str.contains('Unknown')].groupby(
-            'county').deaths.max().sort_values(ascending=False)[:n]
+    latest = get_county_latest()
+    data = latest.top('cases', n, include_unknown)
+    date = latest.latest_date.strftime('%B %d, %Y')
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>County: </b>%{x}" +
-                                               "<br><b>Count: </b>%{y}" +
+                                               "<br><b>Count: </b>%{y:,}" +
                                                "<extra></extra>",
                                  marker={'color': 'green', 'opacity': 0.6})],
                     layout=go.Layout(yaxis={'title': 'Count'},
                                      xaxis={'title': 'County'},
                                      title=f'\nCases in Top {n} US '
-                                           f'Counties\n'))
-    fig.update_layout(height=600)
+                                           f'Counties as of {date}\n'))
+    fig.update_layout(height=600, width=figure_width)
     return fig
 
 
+@memoize()
 def plot_top_n_county_deaths(n=10, include_unknown=True) -> go.Figure:
     """
     A function that generates a plotly bar plot of the death counts of
@@ -46,39 +61,37 @@ def plot_top_n_county_deaths(n=10, include_unknown=True) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    if include_unknown:
-        data = county_df.groupby('county').deaths.max().sort_values(
-            ascending=False)[:n]
-    else:
-        data = county_df.loc[
-                   ~county_df['county'].str.contains('Unknown')].groupby(
-            'county').deaths.max().sort_values(ascending=False)[:n]
+    latest = get_county_latest()
+    data = latest.top('deaths', n, include_unknown)
+    date = latest.latest_date.strftime('%B %d, %Y')
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>County: </b>%{x}" +
-                                               "<br><b>Count: </b>%{y}" +
+                                               "<br><b>Count: </b>%{y:,}" +
                                                "<extra></extra>",
                                  marker={'color': 'green', 'opacity': 0.6})],
                     layout=go.Layout(yaxis={'title': 'Count'},
                                      xaxis={'title': 'County'},
                                      title=f'\nDeath Counts in Top {n} US '
-                                           f'Counties\n'))
-    fig.update_layout(height=600)
+                                           f'Counties as of {date}\n'))
+    fig.update_layout(height=600, width=figure_width)
     return fig
 
 
+@memoize()
 def plot_top_n_county_death_rates(n=10) -> go.Figure:
     """
     A function that generates a plotly bar plot of the death rates of
-    covid-19 for the top n counties in the US.
+    covid-19 for the top n counties in the US with more than 1,000 cases on
+    the latest date.
     :param n: the number of counties to include
     :type n: int
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    mask = (county_df['date'] == county_df['date'].max()) & (
-            county_df['cases'] > 1000)
-    data = county_df[mask].sort_values('death_rate', ascending=False).set_index(
-        'county')['death_rate'][:n].round(2)
+    latest = get_county_latest()
+    data = latest.top('death_rate', n, min_cases=1000,
+                      latest_only=True).round(2)
+    date = latest.latest_date.strftime('%B %d, %Y')
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>County: </b>%{x}" +
                                                "<br><b>Rate: </b>%{y}%" +
@@ -87,11 +100,12 @@ def plot_top_n_county_death_rates(n=10) -> go.Figure:
                     layout=go.Layout(yaxis={'title': 'Rate (%)'},
                                      xaxis={'title': 'County'},
                                      title=f'\nDeath Rates in Top {n} '
-                                           f'Counties\n'))
-    fig.update_layout(height=600)
+                                           f'Counties as of {date}\n'))
+    fig.update_layout(height=600, width=figure_width)
     return fig
 
 
+@memoize()
 def plot_daily_new_cases_by_county(county: str, state: str) -> go.Figure:
     """
     A function that generates a plotly bar plot of daily new cases of
@@ -103,10 +117,10 @@ def plot_daily_new_cases_by_county(county: str, state: str) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    mask = (county_df['state'] == state) & (county_df['county'] == county)
-    filtered_df = county_df[mask]
-    data = filtered_df.set_index('date')['cases'].sort_index().diff()
-    moving_avg = data.rolling('7d').mean().round(0)
+    metrics = get_county_metrics().lookup(state, county)
+    data = metrics['new_cases']
+    moving_avg = metrics['new_cases_avg']
+    data, moving_avg = decimate_daily(data, moving_avg)
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>Date: </b>%{x}" +
                                                "<br><b>Cases: </b>%{y:,}" +
@@ -123,10 +137,11 @@ def plot_daily_new_cases_by_county(county: str, state: str) -> go.Figure:
                              hovertemplate="<b>Date: </b>%{x}" +
                                            "<br><b>7 Day Avg: </b>%{y:,}" +
                                            "<extra></extra>", ))
-    fig.update_layout(height=600, width=900, showlegend=False)
+    fig.update_layout(height=600, width=figure_width, showlegend=False)
     return fig
 
 
+@memoize()
 def plot_daily_new_deaths_by_county(county: str, state: str) -> go.Figure:
     """
     A function that generates a plotly bar plot of daily new cases of
@@ -138,10 +153,10 @@ def plot_daily_new_deaths_by_county(county: str, state: str) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    mask = (county_df['state'] == state) & (county_df['county'] == county)
-    filtered_df = county_df[mask]
-    data = filtered_df.set_index('date')['deaths'].sort_index().diff()
-    moving_avg = data.rolling('7d').mean().round(0)
+    metrics = get_county_metrics().lookup(state, county)
+    data = metrics['new_deaths']
+    moving_avg = metrics['new_deaths_avg']
+    data, moving_avg = decimate_daily(data, moving_avg)
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>Date: </b>%{x}" +
                                                "<br><b>Deaths: </b>%{y:,}" +
@@ -158,5 +173,130 @@ def plot_daily_new_deaths_by_county(county: str, state: str) -> go.Figure:
                              hovertemplate="<b>Date: </b>%{x}" +
                                            "<br><b>7 Day Avg: </b>%{y:,}" +
                                            "<extra></extra>", ))
-    fig.update_layout(height=600, width=900, showlegend=False)
+    fig.update_layout(height=600, width=figure_width, showlegend=False)
+    return fig
+
+
+@memoize()
+def plot_cases_by_county(state: str, county_list=None, max_points=None):
+    """
+    A function that generates a plotly line plot (log scale on the y-axis)
+    of cumulative covid-19 cases for selected counties of a state.
+    :param state: the state of interest
+    :type state: str
+    :param county_list: the counties of interest, by default every county of
+    the state
+    :type county_list: list
+    :param max_points: the largest number of points in each line
+    :type max_points: int
+    :return: a plotly figure object
+    :rtype: go.Figure
+    """
+    if county_list is None:
+        county_list = get_counties(state)
+    series = region_series(get_county_index(),
+                           [(state, county) for county in county_list],
+                           'cases', max_points)
+    return comparison_figure(
+        county_list, series, 'Cases',
+        dict(yaxis={'title': 'Cumulative Cases (log scale)'},
+             xaxis={'title': 'Date'}, yaxis_type='log',
+             title=f'\nCumulative Cases in {state}\n', height=600,
+             width=figure_width, showlegend=True))
+
+
+@memoize()
+def plot_deaths_by_county(state: str, county_list=None, max_points=None):
+    """
+    A function that generates a plotly line plot (log scale on the y-axis)
+    of cumulative covid-19 deaths for selected counties of a state.
+    :param state: the state of interest
+    :type state: str
+    :param county_list: the counties of interest, by default every county of
+    the state
+    :type county_list: list
+    :param max_points: the largest number of points in each line
+    :type max_points: int
+    :return: a plotly figure object
+    :rtype: go.Figure
+    """
+    if county_list is None:
+        county_list = get_counties(state)
+    series = region_series(get_county_index(),
+                           [(state, county) for county in county_list],
+                           'deaths', max_points)
+    return comparison_figure(
+        county_list, series, 'Deaths',
+        dict(yaxis={'title': 'Cumulative Deaths (log scale)'},
+             xaxis={'title': 'Date'}, yaxis_type='log',
+             title=f'\nCumulative Deaths in {state}\n', height=600,
+             width=figure_width, showlegend=True))
+
+
+@memoize()
+def plot_county_map(measure='cases', step=7) -> go.Figure:
+    """
+    A function that generates a plotly choropleth map of covid-19 cases or
+    deaths in every US county, with a slider to move between dates. Each
+    date is a row of the dense county matrices, so no dataframe is read to
+    build the frames. Counties without a FIPS code are not drawn, and the
+    colors are capped at the 99th percentile of the counties so that a few
+    large counties do not wash out the rest. If no county has a FIPS code,
+    the map is drawn without any counties.
+    :param measure: one of map_measures; daily new counts are averaged over
+    the 7 days ending on each date
+    :type measure: str
+    :param step: the number of days between the dates of the slider, which
+    always ends on the latest date
+    :type step: int
+    :return: a plotly figure object
+    :rtype: go.Figure
+    """
+    matrix = get_county_matrix()
+    if matrix.latest_date is None:
+        fig = go.Figure(
+            data=[go.Choropleth(geojson=county_geojson, locations=[], z=[])],
+            layout=go.Layout(title=f'\n{map_measures[measure]} by US County\n',
+                             geo={'scope': 'usa'}))
+        fig.update_layout(height=600, width=figure_width)
+        return fig
+    dates = matrix.dates[::-1][::step][::-1]
+    if measure.startswith('new_'):
+        values = [np.round(matrix.window(date, measure[len('new_'):]), 1)
+                  for date in dates]
+    else:
+        values = [matrix.row(date, measure) for date in dates]
+    zmax = max(float(np.percentile(
+        values if measure.startswith('new_') else values[-1], 99)), 1.)
+    labels = list(np.datetime_as_string(dates))
+    animation = {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': True},
+                 'transition': {'duration': 0}}
+    date = matrix.latest_date.item().strftime('%B %d, %Y')
+    fig = go.Figure(
+        data=[go.Choropleth(geojson=county_geojson,
+                            locations=[f'{code:05d}' for code in matrix.fips],
+                            z=values[-1], text=matrix.labels, zmin=0,
+                            zmax=zmax, colorscale='Reds',
+                            marker={'line': {'width': 0}},
+                            colorbar={'title': 'Count'},
+                            hovertemplate="<b>County: </b>%{text}" +
+                                          "<br><b>Count: </b>%{z:,}" +
+                                          "<extra></extra>")],
+        frames=[go.Frame(data=[go.Choropleth(z=z)], name=label)
+                for z, label in zip(values, labels)],
+        layout=go.Layout(
+            title=f'\n{map_measures[measure]} by US County as of {date}\n',
+            geo={'scope': 'usa'},
+            sliders=[{'active': len(labels) - 1,
+                      'currentvalue': {'prefix': 'Date: '},
+                      'steps': [{'label': label, 'method': 'animate',
+                                 'args': [[label], animation]}
+                                for label in labels]}],
+            updatemenus=[{'type': 'buttons', 'showactive': False,
+                          'buttons': [{'label': 'Play', 'method': 'animate',
+                                       'args': [None, dict(
+                                           animation, fromcurrent=True,
+                                           frame={'duration': 200,
+                                                  'redraw': True})]}]}]))
+    fig.update_layout(height=600, width=figure_width)
     return fig
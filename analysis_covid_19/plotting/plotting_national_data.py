@@ -1,8 +1,33 @@
-from analysis_covid_19.plotting.plotting_state_data import state_df
+from analysis_covid_19.caching import memoize
+from analysis_covid_19.dataframes.dataset import (
+    get_national_metrics, ny_nj)
+from analysis_covid_19.plotting.decimation import decimate_daily, figure_width
 import plotly.graph_objects as go
 
 
-def plot_daily_new_us_cases(include_ny_nj=True) -> go.Figure:
+def exclusion_text(include_ny_nj=True, excluded_states=()) -> str:
+    """
+    A function for describing the states left out of a US plot.
+    :param include_ny_nj: whether New York and New Jersey are included
+    :type include_ny_nj: bool
+    :param excluded_states: other states and territories that are excluded
+    :type excluded_states: list
+    :return: the text to add to the title of the plot
+    :rtype: str
+    """
+    if not excluded_states:
+        return '' if include_ny_nj else " (NY and NJ not included)"
+    excluded = set(excluded_states)
+    if not include_ny_nj:
+        excluded |= ny_nj
+    if len(excluded) > 3:
+        return f' ({len(excluded)} states/territories not included)'
+    return f" ({', '.join(sorted(excluded))} not included)"
+
+
+@memoize()
+def plot_daily_new_us_cases(include_ny_nj=True, excluded_states=()) -> \
+        go.Figure:
     """
     A function that generates a plotly bar plot of daily new cases of
     covid-19 for the US.  A rolling 7 day average is included.
@@ -10,18 +35,16 @@ def plot_daily_new_us_cases(include_ny_nj=True) -> go.Figure:
     York and New Jersey in daily US cases as their inclusion may mask
     increased cases and deaths around the remainder of the country
     :type include_ny_nj: bool
+    :param excluded_states: other states and territories to exclude
+    :type excluded_states: list
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    if include_ny_nj:
-        data = state_df.groupby('date').cases.sum().diff()
-    else:
-        data = state_df[
-            ~state_df['state'].str.contains('New York|New Jersey')].groupby(
-            'date').cases.sum().diff()
-    data = data[data.index > '2020-02-29']
-    ny_nj = '' if include_ny_nj else " (NY and NJ not included)"
-    moving_avg = data.rolling('7d').mean().round(0)
+    metrics = get_national_metrics(include_ny_nj, excluded_states)
+    data = metrics['new_cases']
+    ny_nj = exclusion_text(include_ny_nj, excluded_states)
+    moving_avg = metrics['new_cases_avg']
+    data, moving_avg = decimate_daily(data, moving_avg)
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>Date: </b>%{x}" +
                                                "<br><b>Cases: </b>%{y:,}" +
@@ -38,11 +61,13 @@ def plot_daily_new_us_cases(include_ny_nj=True) -> go.Figure:
                              hovertemplate="<b>Date: </b>%{x}" +
                                            "<br><b>7 Day Avg: </b>%{y:,}" +
                                            "<extra></extra>", ))
-    fig.update_layout(height=600, width=900, showlegend=False)
+    fig.update_layout(height=600, width=figure_width, showlegend=False)
     return fig
 
 
-def plot_daily_new_us_deaths(include_ny_nj=True) -> go.Figure:
+@memoize()
+def plot_daily_new_us_deaths(include_ny_nj=True, excluded_states=()) -> \
+        go.Figure:
     """
     A function that generates a plotly bar plot of daily new deaths of
     covid-19 for the US.  A rolling 7 day average is included.
@@ -50,18 +75,16 @@ def plot_daily_new_us_deaths(include_ny_nj=True) -> go.Figure:
     York and New Jersey in daily US cases as their inclusion may mask
     increased cases and deaths around the remainder of the country
     :type include_ny_nj: bool
+    :param excluded_states: other states and territories to exclude
+    :type excluded_states: list
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    if include_ny_nj:
-        data = state_df.groupby('date').deaths.sum().diff()
-    else:
-        data = state_df[
-            ~state_df['state'].str.contains('New York|New Jersey')].groupby(
-            'date').deaths.sum().diff()
-    ny_nj = '' if include_ny_nj else " (NY and NJ not included)"
-    data = data[data.index > '2020-02-29']
-    moving_avg = data.rolling('7d').mean().round(0)
+    metrics = get_national_metrics(include_ny_nj, excluded_states)
+    data = metrics['new_deaths']
+    ny_nj = exclusion_text(include_ny_nj, excluded_states)
+    moving_avg = metrics['new_deaths_avg']
+    data, moving_avg = decimate_daily(data, moving_avg)
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>Date: </b>%{x}" +
                                                "<br><b>Cases: </b>%{y:,}" +
@@ -77,5 +100,5 @@ def plot_daily_new_us_deaths(include_ny_nj=True) -> go.Figure:
                              hovertemplate="<b>Date: </b>%{x}" +
                                            "<br><b>7 Day Avg: </b>%{y:,}" +
                                            "<extra></extra>", ))
-    fig.update_layout(height=600, width=900, showlegend=False)
+    fig.update_layout(height=600, width=figure_width, showlegend=False)
     return fig
@@ -1,7 +1,14 @@
-from analysis_covid_19.dataframes.state_dataframe import state_df
+from analysis_covid_19.caching import memoize
+from analysis_covid_19.dataframes.dataset import (
+    get_state_df, get_state_index, get_state_latest, get_state_metrics,
+    get_state_rolling)
+from analysis_covid_19.plotting.comparison import (
+    cap_points, comparison_figure, region_series)
+from analysis_covid_19.plotting.decimation import decimate_daily, figure_width
 import plotly.graph_objects as go
 
 
+@memoize()
 def plot_daily_new_cases_by_state(state='California') -> go.Figure:
     """
     A function that generates a plotly bar plot of daily new cases of
@@ -11,9 +18,10 @@ def plot_daily_new_cases_by_state(state='California') -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    data = state_df[state_df.state == state].set_index('date')[
-        'cases'].sort_index().diff()
-    moving_avg = data.rolling('7d').mean().round(0)
+    metrics = get_state_metrics().lookup(state)
+    data = metrics['new_cases']
+    moving_avg = metrics['new_cases_avg']
+    data, moving_avg = decimate_daily(data, moving_avg)
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>Date: </b>%{x}" +
                                                "<br><b>Cases: </b>%{y:,}" +
@@ -28,10 +36,11 @@ def plot_daily_new_cases_by_state(state='California') -> go.Figure:
                              hovertemplate="<b>Date: </b>%{x}" +
                                            "<br><b>7 Day Avg: </b>%{y:,}" +
                                            "<extra></extra>", ))
-    fig.update_layout(height=600, width=900, showlegend=False)
+    fig.update_layout(height=600, width=figure_width, showlegend=False)
     return fig
 
 
+@memoize()
 def plot_daily_new_deaths_by_state(state='California') -> go.Figure:
     """
     A function that generates a plotly bar plot of daily new deaths of
@@ -41,9 +50,10 @@ def plot_daily_new_deaths_by_state(state='California') -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    data = state_df[state_df.state == state].set_index('date')[
-        'deaths'].sort_index().diff()
-    moving_avg = data.rolling('7d').mean().round(0)
+    metrics = get_state_metrics().lookup(state)
+    data = metrics['new_deaths']
+    moving_avg = metrics['new_deaths_avg']
+    data, moving_avg = decimate_daily(data, moving_avg)
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>Date: </b>%{x}" +
                                                "<br><b>Deaths: </b>%{y:,}" +
@@ -59,66 +69,92 @@ def plot_daily_new_deaths_by_state(state='California') -> go.Figure:
                              hovertemplate="<b>Date: </b>%{x}" +
                                            "<br><b>7 Day Avg: </b>%{y:,}" +
                                            "<extra></extra>", ))
-    fig.update_layout(height=600, width=900, showlegend=False)
+    fig.update_layout(height=600, width=figure_width, showlegend=False)
     return fig
 
 
-def plot_cases_by_state(state_list=None) -> go.Figure:
+@memoize()
+def plot_cases_by_state(state_list=None, max_points=None):
     """
     A function that generates a plotly line plot (log scale on the y-axis)
     of cumulative covid-19 cases for selected state(s).
     :param state_list: the state(s) of interest
     :type state_list: list
+    :param max_points: the largest number of points in each line
+    :type max_points: int
     :return: a plotly figure object
     :rtype: go.Figure
     """
     if state_list is None:
         state_list = ['California', 'Arizona', 'Colorado']
-    fig = go.Figure()
-    for s in state_list:
-        data = state_df[state_df.state == s].set_index('date').cases
-        fig.add_trace(go.Scatter(x=data.index, y=data.values,
-                                 hovertemplate=f"{s}" +
-                                               "<br><b>Date: </b>%{x}" +
-                                               "<br><b>Cases: </b>%{y:,}" +
-                                               "<extra></extra>",
-                                 marker={'opacity': 0.4}, name=s))
-    fig.update_layout(yaxis={'title': 'Cumulative Cases (log scale)'},
-                      xaxis={'title': 'Date'}, yaxis_type='log',
-                      title=f'\nCumulative Cases\n', height=600, width=900,
-                      showlegend=True)
-    return fig
+    series = region_series(get_state_index(), state_list, 'cases',
+                           max_points)
+    return comparison_figure(
+        state_list, series, 'Cases',
+        dict(yaxis={'title': 'Cumulative Cases (log scale)'},
+             xaxis={'title': 'Date'}, yaxis_type='log',
+             title=f'\nCumulative Cases\n', height=600, width=figure_width,
+             showlegend=True))
 
 
-def plot_deaths_by_state(state_list=None) -> go.Figure:
+@memoize()
+def plot_deaths_by_state(state_list=None, max_points=None):
     """
     A function that generates a plotly line plot (log scale on the y-axis)
     of cumulative covid-19 deaths for selected state(s).
     :param state_list: the state(s) of interest
     :type state_list: list
+    :param max_points: the largest number of points in each line
+    :type max_points: int
     :return: a plotly figure object
     :rtype: go.Figure
     """
     if state_list is None:
         state_list = ['California', 'Arizona', 'Colorado']
-    fig = go.Figure()
-    for s in state_list:
-        data = state_df[state_df.state == s].set_index('date').deaths
-        fig.add_trace(go.Scatter(x=data.index, y=data.values,
-                                 hovertemplate=f"{s}" +
-                                               "<br><b>Date: </b>%{x}" +
-                                               "<br><b>Deaths: </b>%{y:,}" +
-                                               "<extra></extra>",
-                                 marker={'opacity': 0.4}, name=s))
-    fig.update_layout(yaxis={'title': 'Cumulative Deaths (log scale)'},
-                      xaxis={'title': 'Date'}, yaxis_type='log',
-                      title=f'\nCumulative Deaths\n', height=600, width=900,
-                      showlegend=True)
-    return fig
+    series = region_series(get_state_index(), state_list, 'deaths',
+                           max_points)
+    return comparison_figure(
+        state_list, series, 'Deaths',
+        dict(yaxis={'title': 'Cumulative Deaths (log scale)'},
+             xaxis={'title': 'Date'}, yaxis_type='log',
+             title=f'\nCumulative Deaths\n', height=600, width=figure_width,
+             showlegend=True))
 
-# THE FUNCTIONS BELOW ARE NOT CURRENTLY BEING EMPLOYED IN THE APPLICATION
+
+@memoize()
+def plot_new_cases_per_100k_by_state(state_list=None, days=7,
+                                     max_points=None):
+    """
+    A function that generates a plotly line plot of the rolling average of
+    daily new covid-19 cases per 100,000 people for selected state(s).
+    :param state_list: the state(s) of interest
+    :type state_list: list
+    :param days: the number of days in the rolling average
+    :type days: int
+    :param max_points: the largest number of points in each line
+    :type max_points: int
+    :return: a plotly figure object
+    :rtype: go.Figure
+    """
+    if state_list is None:
+        state_list = ['California', 'Arizona', 'Colorado']
+    rolling = get_state_rolling()
+    series = []
+    for state in state_list:
+        rates = rolling.lookup(state, column='cases', days=days,
+                               per_100k=True).round(1)
+        series.append(cap_points(rates.index.values, rates.values,
+                                 max_points))
+    return comparison_figure(
+        state_list, series, 'Cases per 100k',
+        dict(yaxis={'title': 'Daily Cases per 100,000 People'},
+             xaxis={'title': 'Date'},
+             title=f'\n{days} Day Average of Daily Cases per 100,000 '
+                   f'People\n', height=600, width=figure_width,
+             showlegend=True))
 
 
+@memoize()
 def plot_top_n_state_cases(n=10) -> go.Figure:
     """
     A function that generates a plotly bar plot of the case counts of
@@ -128,21 +164,23 @@ def plot_top_n_state_cases(n=10) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    data = state_df.groupby('state').cases.max().sort_values(ascending=False)[:n]
-    date = state_df['date'].max().strftime('%B %d, %Y')
+    latest = get_state_latest()
+    data = latest.top('cases', n)
+    date = latest.latest_date.strftime('%B %d, %Y')
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>State: </b>%{x}" +
-                                               "<br><b>Count: </b>%{y}" +
+                                               "<br><b>Count: </b>%{y:,}" +
                                                "<extra></extra>",
                                  marker={'color': 'green', 'opacity': 0.6})],
                     layout=go.Layout(yaxis={'title': 'Count'},
                                      xaxis={'title': 'State'},
                                      title=f'\nCases in Top {n} US States '
                                            f'as of {date}\n'))
-    fig.update_layout(height=600)
+    fig.update_layout(height=600, width=figure_width)
     return fig
 
 
+@memoize()
 def plot_top_n_state_deaths(n=10) -> go.Figure:
     """
     A function that generates a plotly bar plot of the death counts of
@@ -152,35 +190,37 @@ def plot_top_n_state_deaths(n=10) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    data = state_df.groupby('state').deaths.max().sort_values(ascending=False)[
-           :n]
-    date = state_df['date'].max().strftime('%B %d, %Y')
+    latest = get_state_latest()
+    data = latest.top('deaths', n)
+    date = latest.latest_date.strftime('%B %d, %Y')
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>State: </b>%{x}" +
-                                               "<br><b>Count: </b>%{y}" +
+                                               "<br><b>Count: </b>%{y:,}" +
                                                "<extra></extra>",
                                  marker={'color': 'green', 'opacity': 0.6})],
                     layout=go.Layout(yaxis={'title': 'Count'},
                                      xaxis={'title': 'State'},
                                      title=f'\nDeath Counts in Top {n} US '
                                            f'States as of {date}\n'))
-    fig.update_layout(height=600)
+    fig.update_layout(height=600, width=figure_width)
     return fig
 
 
+@memoize()
 def plot_top_n_state_death_rates(n=10) -> go.Figure:
     """
     A function that generates a plotly bar plot of the death rates of
-    covid-19 for the top n states.
+    covid-19 for the top n states with more than 1,000 cases on the latest
+    date.
     :param n: the number of states to include
     :type n: int
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    mask = (state_df['date'] == state_df['date'].max()) & (state_df['cases'] > 1000)
-    data = state_df[mask].sort_values('death_rate', ascending=False).set_index(
-        'state')['death_rate'][:n].round(2)
-    date = state_df['date'].max().strftime('%B %d, %Y')
+    latest = get_state_latest()
+    data = latest.top('death_rate', n, min_cases=1000,
+                      latest_only=True).round(2)
+    date = latest.latest_date.strftime('%B %d, %Y')
     fig = go.Figure(data=[go.Bar(x=data.index, y=data.values,
                                  hovertemplate="<b>State: </b>%{x}" +
                                                "<br><b>Rate: </b>%{y}%" +
@@ -190,10 +230,14 @@ def plot_top_n_state_death_rates(n=10) -> go.Figure:
                                      xaxis={'title': 'State'},
                                      title=f'\nDeath Rates in Top {n} States '
                                            f'as of {date}\n'))
-    fig.update_layout(height=600)
+    fig.update_layout(height=600, width=figure_width)
     return fig
 
 
+# THE FUNCTIONS BELOW ARE NOT CURRENTLY BEING EMPLOYED IN THE APPLICATION
+
+
+@memoize()
 def plot_death_rate_by_state(state='California') -> go.Figure:
     """
     A function that generates a plotly line plot of the death rates from
@@ -203,8 +247,7 @@ def plot_death_rate_by_state(state='California') -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
-    data = state_df[state_df.state == state].groupby('date')[
-        ['cases', 'deaths']].sum()
+    data = get_state_index().lookup(state)[['cases', 'deaths']]
     data = data.deaths.div(data.cases).mul(100).round(2)
     fig = go.Figure()
     fig.add_trace(go.Scatter(x=data.index, y=data.values,
@@ -217,6 +260,7 @@ def plot_death_rate_by_state(state='California') -> go.Figure:
     return fig
 
 
+@memoize()
 def plot_death_rate_for_us() -> go.Figure:
     """
     A function that generates a plotly line plot of the death rates from
@@ -224,6 +268,7 @@ def plot_death_rate_for_us() -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
+    state_df = get_state_df()
     data = state_df.groupby('date')[['cases', 'deaths']].sum()
     data = data.deaths.div(data.cases).mul(100).round(2)
     fig = go.Figure()
@@ -237,6 +282,7 @@ def plot_death_rate_for_us() -> go.Figure:
     return fig
 
 
+@memoize()
 def plot_days_from_case_to_death(n=10, smallest=False) -> go.Figure:
     """
     A function that generates a plotly bar plot of the number of days from
@@ -249,6 +295,7 @@ def plot_days_from_case_to_death(n=10, smallest=False) -> go.Figure:
     :return: a plotly figure object
     :rtype: go.Figure
     """
+    state_df = get_state_df()
     first_cases = state_df.groupby('state').date.min()
     first_deaths = state_df[state_df.deaths > 0].groupby('state').date.min()
     data = first_deaths.sub(first_cases).dropna().apply(
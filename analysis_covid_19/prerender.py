@@ -0,0 +1,223 @@
+from analysis_covid_19.dataframes import snapshot
+from analysis_covid_19.dataframes.dataset import Dataset, get_dataset
+from analysis_covid_19.plotting import decimation
+from analysis_covid_19.plotting.plotting_county_data import (
+    plot_daily_new_cases_by_county, plot_daily_new_deaths_by_county)
+from analysis_covid_19.plotting.plotting_national_data import (
+    plot_daily_new_us_cases, plot_daily_new_us_deaths)
+from analysis_covid_19.plotting.plotting_state_data import (
+    plot_daily_new_cases_by_state, plot_daily_new_deaths_by_state)
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+figures_path = snapshot.snapshot_path / 'figures'
+
+plot_functions = {function.__name__: function for function in (
+    plot_daily_new_us_cases, plot_daily_new_us_deaths,
+    plot_daily_new_cases_by_state, plot_daily_new_deaths_by_state,
+    plot_daily_new_cases_by_county, plot_daily_new_deaths_by_county)}
+
+_manifest = {'mtime': None, 'manifest': None}
+_manifest_lock = threading.Lock()
+
+
+def render_settings() -> dict:
+    """
+    A function for obtaining the settings that change how figures are
+    rendered from the same data.
+    :return: the render settings
+    :rtype: dict
+    """
+    return {'decimate': decimation.enabled,
+            'figure_width': decimation.figure_width,
+            'bar_width': decimation.bar_width}
+
+
+def figure_key(name: str, args: tuple, data_version: str) -> str:
+    """
+    A function for generating the manifest key of a figure. The key includes
+    the version of the data and the render settings, so a figure rendered
+    from other data or with other settings is never served in place of one
+    rendered live.
+    :param name: the name of the plot function
+    :type name: str
+    :param args: the arguments of the plot function
+    :type args: tuple
+    :param data_version: the version of the data the figure is rendered from
+    :type data_version: str
+    :return: the manifest key
+    :rtype: str
+    """
+    settings = json.dumps([data_version, render_settings()], sort_keys=True)
+    tag = hashlib.sha256(settings.encode()).hexdigest()[:16]
+    return f'{name}{json.dumps(list(args))}@{tag}'
+
+
+def figure_jobs(dataset: Dataset) -> list:
+    """
+    A function for listing every figure the app can show: the US figures
+    with and without New York and New Jersey, and the daily figures of every
+    state/territory and every county.
+    :param dataset: the dataset the figures are rendered from
+    :type dataset: Dataset
+    :return: a list of plot function names and their arguments
+    :rtype: list
+    """
+    jobs = []
+    for include_ny_nj in (True, False):
+        jobs.append(('plot_daily_new_us_cases', (include_ny_nj, [])))
+        jobs.append(('plot_daily_new_us_deaths', (include_ny_nj, [])))
+    for state in dataset.states_and_territories_list:
+        jobs.append(('plot_daily_new_cases_by_state', (state,)))
+        jobs.append(('plot_daily_new_deaths_by_state', (state,)))
+    for state, county in dataset.county_index.regions():
+        jobs.append(('plot_daily_new_cases_by_county', (county, state)))
+        jobs.append(('plot_daily_new_deaths_by_county', (county, state)))
+    return jobs
+
+
+def write_atomically(path, text: str) -> None:
+    """
+    A function for writing a text file so that readers never see it
+    partially written.
+    :param path: the path of the file
+    :type path: pathlib.Path
+    :param text: the contents of the file
+    :type text: str
+    """
+    temporary = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(temporary, 'w') as fp:
+        fp.write(text)
+    os.replace(temporary, path)
+
+
+def render_figure(job: tuple) -> tuple:
+    """
+    A function for rendering one figure to json and storing it under the
+    sha256 of its contents.
+    :param job: the name of a plot function and its arguments
+    :type job: tuple
+    :return: the manifest key, the sha256 and the seconds taken to render
+    :rtype: tuple
+    """
+    name, args = job
+    start = time.perf_counter()
+    payload = plot_functions[name](*args).to_json()
+    seconds = time.perf_counter() - start
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    path = figures_path / 'objects' / f'{digest}.json'
+    if not path.exists():
+        write_atomically(path, payload)
+    return (figure_key(name, args, get_dataset().data_version), digest,
+            seconds)
+
+
+def _init_worker() -> None:
+    # workers load the snapshots the parent process has just validated
+    snapshot.max_age = float('inf')
+
+
+def prerender(workers=None) -> dict:
+    """
+    A function for rendering every figure the app can show across a pool of
+    worker processes, writing each to a content-addressed store and then
+    replacing the manifest that maps figures to their contents. Contents no
+    longer in the manifest are removed.
+    :param workers: the number of worker processes, by default one per cpu
+    :type workers: int
+    :return: the seconds taken to render each figure
+    :rtype: dict
+    """
+    dataset = get_dataset()
+    jobs = figure_jobs(dataset)
+    (figures_path / 'objects').mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        results = list(pool.map(render_figure, jobs,
+                                chunksize=max(1, len(jobs) // 64)))
+    manifest = {'data_version': dataset.data_version,
+                'settings': render_settings(),
+                'figures': {key: digest for key, digest, _ in results}}
+    write_atomically(figures_path / 'manifest.json', json.dumps(manifest))
+    timings = {key: seconds for key, _, seconds in results}
+    write_atomically(figures_path / 'timings.json', json.dumps(timings))
+    digests = set(manifest['figures'].values())
+    for path in (figures_path / 'objects').glob('*.json'):
+        if path.stem not in digests:
+            path.unlink()
+    return timings
+
+
+def read_manifest() -> dict:
+    """
+    A function for reading the manifest of prerendered figures, rereading
+    it only when the file has changed.
+    :return: the manifest, or None if there are no prerendered figures
+    :rtype: dict
+    """
+    path = figures_path / 'manifest.json'
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _manifest_lock:
+        if _manifest['mtime'] != mtime:
+            with open(path) as fp:
+                _manifest['manifest'] = json.load(fp)
+            _manifest['mtime'] = mtime
+        return _manifest['manifest']
+
+
+def get_figure(function, *args):
+    """
+    A function for obtaining a figure for the app. The prerendered json of
+    the figure is returned if it was rendered from the dataset currently in
+    use with the current render settings; otherwise, as after the refresher
+    has swapped in new data, the figure is built by calling the plot
+    function.
+    :param function: a plot function
+    :type function: callable
+    :param args: the arguments of the plot function
+    :return: a plotly figure dict or figure object
+    """
+    manifest = read_manifest()
+    if manifest is not None:
+        digest = manifest['figures'].get(figure_key(
+            function.__name__, args, get_dataset().data_version))
+        if digest is not None:
+            try:
+                with open(figures_path / 'objects' / f'{digest}.json') as fp:
+                    return json.load(fp)
+            except OSError:
+                pass
+    return function(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Prerender the figure json of every state, county and '
+                    'national figure for the current data.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--slowest', type=int, default=10)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    timings = prerender(args.workers)
+    elapsed = time.perf_counter() - start
+    seconds = sorted(timings.values())
+    print(f'rendered {len(seconds)} figures in {elapsed:.1f}s')
+    if seconds:
+        print(f'per figure: median {seconds[len(seconds) // 2] * 1000:.1f}ms,'
+              f' 95th percentile '
+              f'{seconds[int(len(seconds) * 0.95)] * 1000:.1f}ms, max '
+              f'{seconds[-1] * 1000:.1f}ms')
+    for key, value in sorted(timings.items(), key=lambda item: -item[1])[
+                      :args.slowest]:
+        print(f'{value * 1000:8.1f}ms  {key}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,77 +1,162 @@
 import streamlit as st
+import pandas as pd
+from analysis_covid_19 import instrumentation
+from analysis_covid_19.api import start_api
+from analysis_covid_19.caching import cache_info
 from analysis_covid_19.page_data.data import page_data
 from analysis_covid_19.plotting.plotting_national_data import (
     plot_daily_new_us_cases, plot_daily_new_us_deaths)
 from analysis_covid_19.plotting.plotting_state_data import (
     plot_daily_new_cases_by_state, plot_daily_new_deaths_by_state,
-    plot_cases_by_state, plot_deaths_by_state)
+    plot_cases_by_state, plot_deaths_by_state,
+    plot_new_cases_per_100k_by_state, plot_top_n_state_cases,
+    plot_top_n_state_deaths, plot_top_n_state_death_rates)
 from analysis_covid_19.plotting.plotting_county_data import (
-    plot_daily_new_cases_by_county, plot_daily_new_deaths_by_county)
-from analysis_covid_19.dataframes.county_dataframe import (
-    get_counties, states_and_territories_list, states_list)
+    map_measures, plot_county_map, plot_daily_new_cases_by_county,
+    plot_daily_new_deaths_by_county, plot_top_n_county_cases,
+    plot_top_n_county_deaths, plot_top_n_county_death_rates)
+from analysis_covid_19.dataframes.dataset import (
+    get_counties, get_dataset, get_states_and_territories_list,
+    get_states_list, prefetch, start_refresher, use_dataset)
 from analysis_covid_19.page_content.content import page_content
+from analysis_covid_19.prerender import get_figure
 
+leaderboard_plots = {
+    'Cases': (plot_top_n_state_cases, plot_top_n_county_cases),
+    'Deaths': (plot_top_n_state_deaths, plot_top_n_county_deaths),
+    'Death rates': (plot_top_n_state_death_rates,
+                    plot_top_n_county_death_rates)}
 
-def main():
-    generate_intro()
-    generate_us_plots()
-    generate_state_plots()
-    generate_state_comparison_plots()
-    generate_county_plots()
-    generate_conclusion()
+
+@st.cache(allow_output_mutation=True, show_spinner=False)
+def start_background_threads():
+    # cached so that the threads are started once per process rather than
+    # on every rerun of the script
+    return start_refresher(), start_api()
 
 
+def main():
+    start_background_threads()
+    with instrumentation.run('app.main'), use_dataset():
+        prefetch()
+        generate_intro()
+        generate_us_plots()
+        generate_state_plots()
+        generate_state_comparison_plots()
+        generate_county_plots()
+        generate_county_map()
+        generate_leaderboard_plots()
+        generate_conclusion()
+    if instrumentation.debug_panel:
+        generate_debug_panel()
+
+
+@instrumentation.timed()
 def generate_intro():
     st.title('COVID-19 Analysis')
     st.subheader(page_data.current_date)
-    st.markdown(page_content.introduction)
+    with st.spinner('Loading the latest covid-19 data...'):
+        introduction = page_content.introduction
+    st.markdown(introduction)
 
 
+@instrumentation.timed()
 def generate_us_plots():
     st.subheader(page_content.us_plots_text)
     include_ny_nj = st.checkbox('Include New York and New Jersey data?',
                                 value=True)
-    new_us_cases = plot_daily_new_us_cases(include_ny_nj)
-    new_us_deaths = plot_daily_new_us_deaths(include_ny_nj)
+    excluded_states = st.multiselect('Exclude other states/territories',
+                                     get_states_and_territories_list())
+    new_us_cases = get_figure(plot_daily_new_us_cases, include_ny_nj,
+                              excluded_states)
+    new_us_deaths = get_figure(plot_daily_new_us_deaths, include_ny_nj,
+                               excluded_states)
     st.plotly_chart(new_us_cases)
     st.plotly_chart(new_us_deaths)
 
 
+@instrumentation.timed()
 def generate_state_plots():
     st.subheader(page_content.state_plots_text)
-    state = st.selectbox("State/Territory", states_and_territories_list)
-    new_cases_by_state = plot_daily_new_cases_by_state(state)
-    new_deaths_by_state = plot_daily_new_deaths_by_state(state)
+    state = st.selectbox("State/Territory", get_states_and_territories_list())
+    new_cases_by_state = get_figure(plot_daily_new_cases_by_state, state)
+    new_deaths_by_state = get_figure(plot_daily_new_deaths_by_state, state)
     st.plotly_chart(new_cases_by_state)
     st.plotly_chart(new_deaths_by_state)
 
 
+@instrumentation.timed()
 def generate_state_comparison_plots():
     st.subheader(page_content.state_comparison_plots_text)
     selections = st.multiselect("States/Territories",
-                                states_and_territories_list,
+                                get_states_and_territories_list(),
                                 default=['Colorado'])
     cases_by_state = plot_cases_by_state(selections)
     deaths_by_state = plot_deaths_by_state(selections)
+    cases_per_100k = plot_new_cases_per_100k_by_state(selections)
     st.plotly_chart(cases_by_state)
     st.plotly_chart(deaths_by_state)
+    st.plotly_chart(cases_per_100k)
 
 
+@instrumentation.timed()
 def generate_county_plots():
     st.subheader(page_content.county_plots_text)
-    state = st.selectbox("State", states_list)
+    state = st.selectbox("State", get_states_list())
     counties = get_counties(state)
     county = st.selectbox("County", counties)
-    cases_by_county = plot_daily_new_cases_by_county(county, state)
-    deaths_by_county = plot_daily_new_deaths_by_county(county, state)
+    cases_by_county = get_figure(plot_daily_new_cases_by_county, county,
+                                 state)
+    deaths_by_county = get_figure(plot_daily_new_deaths_by_county, county,
+                                  state)
     st.plotly_chart(cases_by_county)
     st.plotly_chart(deaths_by_county)
 
 
+@instrumentation.timed()
+def generate_county_map():
+    st.subheader(page_content.county_map_text)
+    measure = st.selectbox("Measure", list(map_measures),
+                           format_func=map_measures.get)
+    st.plotly_chart(plot_county_map(measure))
+
+
+@instrumentation.timed()
+def generate_leaderboard_plots():
+    st.subheader(page_content.leaderboard_plots_text)
+    ranking = st.selectbox("Ranking", list(leaderboard_plots))
+    n = st.slider("Number of states/counties", 5, 25, 10)
+    plot_states, plot_counties = leaderboard_plots[ranking]
+    st.plotly_chart(plot_states(n))
+    st.plotly_chart(plot_counties(n))
+
+
+@instrumentation.timed()
 def generate_conclusion():
     st.markdown(page_content.conclusion)
     st.markdown('-Kevin Vanderveen, MD')
 
 
+def generate_debug_panel():
+    spans = instrumentation.last_run()
+    st.sidebar.subheader('Last run (ms)')
+    st.sidebar.table(pd.Series(
+        [s['seconds'] * 1000 for s in spans],
+        index=[s['span'] for s in spans], name='ms').round(1))
+    loads = {name: s['seconds'] * 1000 for name, s in
+             instrumentation.latest.items() if name.startswith('dataset.')}
+    st.sidebar.subheader('Data loads (ms)')
+    st.sidebar.table(pd.Series(loads, name='ms').round(1))
+    caches = pd.DataFrame(cache_info()).T
+    caches['hit_rate'] = (caches['hits'] / (caches['hits'] + caches['misses'])
+                          ).round(2)
+    caches.index = [name.rsplit('.', 1)[-1] for name in caches.index]
+    st.sidebar.subheader('Figure caches')
+    st.sidebar.table(caches[['hits', 'misses', 'hit_rate']])
+    memory = pd.Series(get_dataset().memory_usage(), name='MB') / 2 ** 20
+    st.sidebar.subheader('Dataframe memory (MB)')
+    st.sidebar.table(memory.round(1))
+
+
 if __name__ == '__main__':
     main()
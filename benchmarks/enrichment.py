@@ -0,0 +1,59 @@
+from analysis_covid_19.dataframes.county_dataframe import (
+    get_state_abbreviations, parse_county_data)
+from benchmarks.synthetic import generate_county_csv
+from pathlib import Path
+import argparse
+import tempfile
+import time
+import pandas as pd
+
+
+def parse_county_data_rowwise(path) -> pd.DataFrame:
+    """
+    The county parser as it was before the enrichment step was vectorized,
+    kept for comparison.
+    """
+    abbreviations = get_state_abbreviations()
+    df = pd.read_csv(path, parse_dates=['date'])
+    df['county_state'] = df['county'] + ' (' + df['state'].apply(
+        lambda x: abbreviations.get(x)) + ')'
+    df['county_state'].fillna('Unknown', inplace=True)
+    df['death_rate'] = df['deaths'] / df['cases'] * 100
+    return df
+
+
+def best_time(function, path, repeat) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(path)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time parsing and enriching a synthetic county csv file '
+                    'with the row-wise and vectorized enrichment steps.')
+    parser.add_argument('--days', type=int, default=700)
+    parser.add_argument('--counties', type=int, default=3200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'us-counties.csv'
+        rows = generate_county_csv(path, args.days, args.counties)
+        read_time = best_time(
+            lambda p: pd.read_csv(p, parse_dates=['date']), path, args.repeat)
+        rowwise = best_time(parse_county_data_rowwise, path, args.repeat)
+        vectorized = best_time(
+            lambda p: parse_county_data(open(p, 'rb')), path, args.repeat)
+    print(f'{rows:,} rows')
+    print(f'read_csv only:          {read_time:.2f}s')
+    print(f'parse + enrich before:  {rowwise:.2f}s '
+          f'(enrich {rowwise - read_time:.2f}s)')
+    print(f'parse + enrich after:   {vectorized:.2f}s '
+          f'(enrich {vectorized - read_time:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+from analysis_covid_19 import caching, prerender
+from analysis_covid_19.dataframes import (
+    county_dataframe, dataset, snapshot, state_dataframe)
+from analysis_covid_19.plotting import (
+    plotting_county_data, plotting_national_data, plotting_state_data)
+from benchmarks.synthetic import generate_county_csv, generate_state_csv
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import functools
+import importlib
+import inspect
+import io
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import numpy as np
+import pandas as pd
+import plotly
+
+import_statement = ('import analysis_covid_19.prerender, '
+                    'analysis_covid_19.page_data.data, '
+                    'analysis_covid_19.page_content.content')
+
+
+class HeadlessStreamlit(types.ModuleType):
+    """
+    A class that stands in for the streamlit module so that app.main() can
+    be run without a browser. Widgets return their default values and
+    figures are serialized to json, as streamlit does before sending them to
+    the browser.
+    """
+
+    def __init__(self):
+        super().__init__('streamlit')
+        self.charts = 0
+        self.sidebar = self
+
+    def title(self, body):
+        pass
+
+    subheader = markdown = table = title
+
+    def checkbox(self, label, value=False):
+        return value
+
+    def selectbox(self, label, options, format_func=None):
+        return list(options)[0]
+
+    def multiselect(self, label, options, default=None):
+        return list(default or [])
+
+    def slider(self, label, min_value=None, max_value=None, value=None):
+        return value
+
+    def plotly_chart(self, figure_or_data):
+        self.charts += 1
+        if isinstance(figure_or_data, dict):
+            json.dumps(figure_or_data, cls=plotly.utils.PlotlyJSONEncoder)
+        else:
+            figure_or_data.to_json()
+
+    @contextmanager
+    def spinner(self, text=''):
+        yield
+
+    def cache(self, func=None, **kwargs):
+        if func is None:
+            return self.cache
+        return functools.lru_cache(maxsize=None)(func)
+
+
+def plot_arguments(state: str, county: str) -> dict:
+    """
+    A function for choosing the arguments each plot function is timed
+    with.
+    :param state: a state with counties
+    :type state: str
+    :param county: a county of the state
+    :type county: str
+    :return: the positional arguments of each plot function
+    :rtype: dict
+    """
+    states = dataset.get_states_and_territories_list()
+    return {'plot_daily_new_cases_by_county': (county, state),
+            'plot_daily_new_deaths_by_county': (county, state),
+            'plot_cases_by_county': (state,),
+            'plot_deaths_by_county': (state,),
+            'plot_daily_new_cases_by_state': (state,),
+            'plot_daily_new_deaths_by_state': (state,),
+            'plot_death_rate_by_state': (state,),
+            'plot_cases_by_state': (states,),
+            'plot_deaths_by_state': (states,)}
+
+
+def plot_functions() -> list:
+    """
+    A function for listing every plot function of the plotting modules.
+    :return: a list of plot functions
+    :rtype: list
+    """
+    functions = []
+    for module in (plotting_national_data, plotting_state_data,
+                   plotting_county_data):
+        functions += [function for name, function in
+                      inspect.getmembers(module, inspect.isfunction)
+                      if name.startswith('plot_') and
+                      function.__module__ == module.__name__]
+    return functions
+
+
+def measure(function, repeat=3, setup=None) -> dict:
+    """
+    A function for timing a function and measuring the peak memory it
+    allocates. The function is timed repeat times, calling setup before each
+    call, and then run once more under tracemalloc.
+    :param function: the function to measure
+    :type function: callable
+    :param repeat: the number of timed calls
+    :type repeat: int
+    :param setup: a function called before each call, outside of the timing
+    :type setup: callable
+    :return: the best and mean seconds, and the peak bytes allocated
+    :rtype: dict
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times),
+            'peak_bytes': peak}
+
+
+def measure_import(repeat=3) -> dict:
+    """
+    A function for timing the import of the application's modules in a new
+    interpreter, less the time taken to start the interpreter.
+    :param repeat: the number of timed imports
+    :type repeat: int
+    :return: the best and mean seconds
+    :rtype: dict
+    """
+
+    def run(statement):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], check=True,
+                       cwd=str(Path(__file__).resolve().parents[1]))
+        return time.perf_counter() - start
+
+    startup = min(run('pass') for _ in range(repeat))
+    times = [run(import_statement) - startup for _ in range(repeat)]
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times)}
+
+
+def reset_dataset() -> None:
+    # start from an unloaded dataset, as a new app process would
+    for thread in dataset.prefetch():
+        thread.join()
+    dataset._dataset = dataset.Dataset(dataset.get_dataset().version + 1)
+    caching.clear_caches()
+
+
+def run_benchmarks(directory: Path, days=300, counties=3000, repeat=3) -> \
+        dict:
+    """
+    A function for running every benchmark against synthetic csv files
+    written to a directory, which also holds the snapshots.
+    :param directory: the directory to write the files to
+    :type directory: Path
+    :param days: the number of days of synthetic data
+    :type days: int
+    :param counties: the number of synthetic counties
+    :type counties: int
+    :param repeat: the number of timed calls of each benchmark
+    :type repeat: int
+    :return: the configuration and results of the benchmarks
+    :rtype: dict
+    """
+    county_path = directory / 'us-counties.csv'
+    state_path = directory / 'us-states.csv'
+    rows = generate_county_csv(county_path, days, counties)
+    generate_state_csv(county_path, state_path)
+    county_dataframe.source = str(county_path)
+    state_dataframe.source = str(state_path)
+    snapshot.snapshot_path = directory / 'snapshots'
+    prerender.figures_path = snapshot.snapshot_path / 'figures'
+
+    def remove_snapshots():
+        shutil.rmtree(snapshot.snapshot_path, ignore_errors=True)
+
+    results = {'import': measure_import(repeat)}
+    payload = county_path.read_bytes()
+    for parser in (county_dataframe.parse_county_data,
+                   county_dataframe.stream_county_data):
+        result = measure(lambda: parser(io.BytesIO(payload)), repeat)
+        result['rows_per_second'] = rows / result['seconds']
+        results[parser.__name__] = result
+    results['get_county_dataframe (csv)'] = measure(
+        county_dataframe.get_county_dataframe, repeat, remove_snapshots)
+    results['get_county_dataframe (snapshot)'] = measure(
+        county_dataframe.get_county_dataframe, repeat)
+    results['get_state_dataframe (csv)'] = measure(
+        state_dataframe.get_state_dataframe, repeat, remove_snapshots)
+    results['get_state_dataframe (snapshot)'] = measure(
+        state_dataframe.get_state_dataframe, repeat)
+    county_dataframe.get_county_dataframe()
+    results['dataset (all derived values)'] = measure(
+        lambda: dataset._build(dataset.get_dataset(), (
+            dataset.prefetch_state_names + dataset.prefetch_county_names +
+            ['states_and_territories_list', 'states_list'])),
+        repeat, reset_dataset)
+    states = dataset.get_states_list()
+    results['get_counties (every state)'] = measure(
+        lambda: [dataset.get_counties(state) for state in states], repeat)
+    state = states[0]
+    county = dataset.get_counties(state)[0]
+    arguments = plot_arguments(state, county)
+    for function in plot_functions():
+        args = arguments.get(function.__name__, ())
+        results[function.__name__] = measure(
+            lambda: function(*args), repeat, caching.clear_caches)
+    sys.modules['streamlit'] = HeadlessStreamlit()
+    app = importlib.import_module('app')
+    results['app.main (first run)'] = measure(app.main, repeat, reset_dataset)
+    results['app.main (rerun)'] = measure(app.main, repeat)
+    return {'config': {'days': days, 'counties': counties, 'rows': rows,
+                       'repeat': repeat,
+                       'compact': county_dataframe.compact,
+                       'streaming': county_dataframe.streaming,
+                       'python': platform.python_version(),
+                       'numpy': np.__version__, 'pandas': pd.__version__,
+                       'plotly': plotly.__version__},
+            'results': results}
+
+
+def compare(previous: dict, current: dict, threshold=1.2) -> list:
+    """
+    A function for finding the benchmarks that have become slower between
+    two runs.
+    :param previous: the results of the earlier run
+    :type previous: dict
+    :param current: the results of the later run
+    :type current: dict
+    :param threshold: the ratio of the times above which a benchmark is
+    reported
+    :type threshold: float
+    :return: a list of the name and time ratio of each slower benchmark
+    :rtype: list
+    """
+    slower = []
+    for name, result in current['results'].items():
+        before = previous['results'].get(name)
+        if before and before['seconds'] > 0:
+            ratio = result['seconds'] / before['seconds']
+            if ratio > threshold:
+                slower.append((name, ratio))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time loading the data, building each figure and '
+                    'rerunning the app against synthetic csv files, and '
+                    'write the results as json.')
+    parser.add_argument('--days', type=int, default=300)
+    parser.add_argument('--counties', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None,
+                        help='the results of an earlier run to compare to')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        report = run_benchmarks(Path(directory), args.days, args.counties,
+                                args.repeat)
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=2)
+    for name, result in report['results'].items():
+        peak = result.get('peak_bytes')
+        memory = f'{peak / 2 ** 20:9.1f}MB' if peak is not None else ''
+        throughput = result.get('rows_per_second')
+        if throughput is not None:
+            name = f'{name} ({throughput:,.0f} rows/s)'
+        print(f'{result["seconds"] * 1000:10.1f}ms {memory}  {name}')
+    if args.compare:
+        with open(args.compare) as fp:
+            slower = compare(json.load(fp), report, args.threshold)
+        for name, ratio in slower:
+            print(f'slower: {name} ({ratio:.2f}x)')
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import threading
+import time
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    A class that serves the files of a directory the way GitHub serves the
+    NYT csv files: with an ETag and Last-Modified header, conditional
+    requests, and gzip compression when it is accepted. The server can be
+    made to fail or stall requests to exercise retries and timeouts.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+        if server.delay:
+            time.sleep(server.delay)
+        if fail:
+            return self.respond(503, b'')
+        path = server.directory / self.path.lstrip('/').split('?')[0]
+        if not path.is_file():
+            return self.respond(404, b'')
+        body = path.read_bytes()
+        stat = path.stat()
+        headers = {'ETag': f'"{hashlib.sha256(body).hexdigest()[:16]}"',
+                   'Last-Modified': formatdate(stat.st_mtime, usegmt=True)}
+        if self.headers.get('If-None-Match') == headers['ETag']:
+            return self.respond(304, b'', headers)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        self.respond(200, body, headers)
+
+    def respond(self, status: int, body: bytes, headers=None) -> None:
+        """
+        A method for sending a response.
+        :param status: the http status code
+        :type status: int
+        :param body: the body of the response
+        :type body: bytes
+        :param headers: further headers to send
+        :type headers: dict
+        """
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory, port=0, failures=0, delay=0.0) -> ThreadingHTTPServer:
+    """
+    A function for serving the files of a directory from a background
+    thread. The server counts the requests it receives and the bytes of the
+    bodies it sends.
+    :param directory: the directory to serve
+    :type directory: Path
+    :param port: the port to listen on, by default any free port
+    :type port: int
+    :param failures: the number of requests to answer with a 503 before
+    serving files
+    :type failures: int
+    :param delay: the seconds to wait before answering each request
+    :type delay: float
+    :return: the running server; its url is f'http://127.0.0.1:{port}'
+    where port is server.server_address[1]
+    :rtype: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.directory = Path(directory)
+    server.failures = failures
+    server.delay = delay
+    server.requests = 0
+    server.bytes_sent = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name='stub-server').start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a directory of csv files over http, as the NYT '
+                    'files are served, to point COVID_COUNTY_SOURCE and '
+                    'COVID_STATE_SOURCE at.')
+    parser.add_argument('directory')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--failures', type=int, default=0,
+                        help='the number of requests to fail with a 503')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='the seconds to wait before each response')
+    args = parser.parse_args()
+    server = serve(args.directory, args.port, args.failures, args.delay)
+    print(f'serving {args.directory} at '
+          f'http://127.0.0.1:{server.server_address[1]}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
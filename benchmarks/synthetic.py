@@ -0,0 +1,73 @@
+from analysis_covid_19.dataframes.county_dataframe import (
+    get_state_abbreviations)
+import numpy as np
+import pandas as pd
+
+
+def generate_county_csv(path, days=300, counties=3000, seed=0) -> int:
+    """
+    A function for writing a synthetic csv file with the same columns, sort
+    order and quirks as the New York Time's csv file of covid-19 data for US
+    counties: each state has an 'Unknown' county without a FIPS code,
+    counties begin reporting on different days and a few reports are
+    missing.
+    :param path: the path of the csv file to write
+    :type path: str
+    :param days: the number of days of data
+    :type days: int
+    :param counties: the number of counties
+    :type counties: int
+    :param seed: the seed of the random number generator
+    :type seed: int
+    :return: the number of rows written
+    :rtype: int
+    """
+    rng = np.random.RandomState(seed)
+    states = sorted(get_state_abbreviations())
+    state = np.arange(counties) % len(states)
+    number = np.arange(counties) // len(states)
+    county = np.array([f'County {n}' if n else 'Unknown' for n in number],
+                      dtype=object)
+    fips = np.where(number > 0, (state + 1) * 1000 + number, np.nan)
+    first_day = rng.randint(0, days // 2, counties)
+    day, region = np.divmod(np.arange(days * counties), counties)
+    keep = (day >= first_day[region]) & (rng.random_sample(len(day)) > 0.01)
+    day, region = day[keep], region[keep]
+    daily = rng.poisson(5, len(day))
+    cases = pd.Series(daily).groupby(region).cumsum().values
+    deaths = pd.Series(rng.binomial(daily, 0.02)).groupby(
+        region).cumsum().values
+    df = pd.DataFrame({
+        'date': pd.Timestamp('2020-01-21') + pd.to_timedelta(day, unit='D'),
+        'county': county[region],
+        'state': np.array(states, dtype=object)[state[region]],
+        'fips': pd.arrays.IntegerArray(
+            np.nan_to_num(fips[region]).astype('int64'),
+            np.isnan(fips[region])),
+        'cases': cases,
+        'deaths': deaths})
+    df = df.sort_values(['date', 'state', 'county'], kind='mergesort')
+    df.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return len(df)
+
+
+def generate_state_csv(county_path, path) -> int:
+    """
+    A function for writing a synthetic csv file with the same columns as the
+    New York Time's csv file of covid-19 data for US states, by summing a
+    synthetic county csv file.
+    :param county_path: the path of a csv file from generate_county_csv
+    :type county_path: str
+    :param path: the path of the csv file to write
+    :type path: str
+    :return: the number of rows written
+    :rtype: int
+    """
+    county_df = pd.read_csv(county_path, parse_dates=['date'])
+    df = county_df.groupby(['date', 'state'])[['cases', 'deaths']].sum(
+    ).reset_index()
+    states = sorted(get_state_abbreviations())
+    df['fips'] = df['state'].map({s: i + 1 for i, s in enumerate(states)})
+    df = df[['date', 'state', 'fips', 'cases', 'deaths']]
+    df.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return len(df)